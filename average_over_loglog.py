@@ -1,39 +1,62 @@
-from typing import Tuple
+from typing import Tuple, Union
 
 import numpy as np
 
+from .profiling import stage
 
-def average_over_loglog(arrs: Tuple[np.ndarray], out_points: int = 100) -> np.ndarray:
-    """Average arrays with log-log data."""
 
-    def _get_bin_width(data: np.ndarray, idx: int) -> float:
+def average_over_loglog(
+    arrs: Union[Tuple[np.ndarray], np.ndarray], out_points: int = 100
+) -> np.ndarray:
+    """Average arrays with log-log data.
+
+    Arrays can be passed either as a tuple of two dimensional arrays, or as a
+    single three dimensional (curves x points x 2) array. In the latter case
+    (or if all arrays have the same shape) all curves are resampled at once.
+    """
+
+    def _get_bin_widths(x: np.ndarray) -> np.ndarray:
         # Bin width is estimated to be half of the
         # interval between surrounding points.
-        before = data[idx - 1, 0] if (idx > 0) else 0.0
-        next = data[idx + 1, 0] if (idx < len(data) - 1) else data[idx, 0]
+        before = np.concatenate((np.zeros((x.shape[0], 1)), x[:, :-1]), axis=1)
+        next = np.concatenate((x[:, 1:], x[:, -1:]), axis=1)
         return (next - before) / 2.0
 
     def _resample_area(data: np.ndarray, x_poles: np.ndarray) -> np.ndarray:
-        areas = np.zeros(len(x_poles))
-        data_idx = 0
-        for idx, pole in enumerate(x_poles):
-            integral = 0.0
-            total_width = 0.0
-            while data_idx < len(data) and data[data_idx, 0] < pole:
-                width = _get_bin_width(data, data_idx)
-                total_width = total_width + width
-                integral = integral + data[data_idx, 1] * width
-                data_idx = data_idx + 1
-            if total_width > 0:
-                areas[idx] = integral / total_width
+        n_curves = data.shape[0]
+        n_poles = len(x_poles) + 1
+        widths = _get_bin_widths(data[:, :, 0])
+        # each point contributes to the first pole above it (points above
+        # the last pole are collected by the extra pole, which is dropped)
+        pole_idx = np.searchsorted(x_poles, data[:, :, 0], side="right")
+        pole_idx = (pole_idx + n_poles * np.arange(n_curves)[:, None]).ravel()
+        integral = np.bincount(
+            pole_idx,
+            weights=(data[:, :, 1] * widths).ravel(),
+            minlength=n_curves * n_poles,
+        ).reshape(n_curves, n_poles)[:, :-1]
+        total_width = np.bincount(
+            pole_idx, weights=widths.ravel(), minlength=n_curves * n_poles
+        ).reshape(n_curves, n_poles)[:, :-1]
+        areas = np.zeros(integral.shape)
+        populated = total_width > 0
+        areas[populated] = integral[populated] / total_width[populated]
         return areas
 
-    min_x = np.min([np.min(arr[:, 0]) for arr in arrs])
-    max_x = np.max([np.max(arr[:, 0]) for arr in arrs])
-    x_poles = np.logspace(np.log10(min_x), np.log10(max_x), out_points)
-    resampled = np.mean(
-        np.array([_resample_area(arr, x_poles) for arr in arrs]), axis=0
-    )
-    x_poles = x_poles * np.sqrt(x_poles[0] / x_poles[1])
-    resampled = np.vstack((x_poles, resampled)).T
-    return resampled[resampled[:, 1] > 0]
+    with stage("average_over_loglog.resample"):
+        if isinstance(arrs, np.ndarray) and arrs.ndim == 3:
+            stacked = [arrs]
+        elif len(set(arr.shape for arr in arrs)) == 1:
+            stacked = [np.stack(arrs)]
+        else:
+            stacked = [arr[None] for arr in arrs]
+
+        min_x = np.min([np.min(arr[:, :, 0]) for arr in stacked])
+        max_x = np.max([np.max(arr[:, :, 0]) for arr in stacked])
+        x_poles = np.logspace(np.log10(min_x), np.log10(max_x), out_points)
+        resampled = np.mean(
+            np.concatenate([_resample_area(arr, x_poles) for arr in stacked]), axis=0
+        )
+        x_poles = x_poles * np.sqrt(x_poles[0] / x_poles[1])
+        resampled = np.vstack((x_poles, resampled)).T
+        return resampled[resampled[:, 1] > 0]
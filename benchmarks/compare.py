@@ -0,0 +1,99 @@
+import argparse
+import json
+import sys
+from typing import List, Optional
+
+
+def compare_reports(
+    base: dict,
+    new: dict,
+    time_threshold: float = 1.25,
+    memory_threshold: float = 1.25,
+    min_time: float = 0.01,
+) -> List[dict]:
+    """Compare two benchmark reports produced by `run_benchmarks`.
+
+    Input:
+        base:
+            Report of the reference revision.
+        new:
+            Report of the revision under test.
+        time_threshold:
+            Ratio of wall times above which a slowdown is reported.
+        memory_threshold:
+            Ratio of peak memory above which a regression is reported.
+        min_time:
+            Wall times shorter than this (in seconds) are too noisy to be
+            compared.
+
+    Output:
+        List of records, one per (case, size) pair present in both
+        reports. Each holds time and memory ratios (new / base), values of
+        the statistic and list of detected regressions.
+    """
+    base_records = {(r["case"], r["size"]): r for r in base["results"]}
+    rows = []
+    for record in new["results"]:
+        key = (record["case"], record["size"])
+        if key not in base_records:
+            continue
+        old = base_records[key]
+        row = {"case": key[0], "size": key[1], "regressions": []}
+        if "error" in record and "error" not in old:
+            row["regressions"].append("error")
+        if "error" not in record and "error" not in old:
+            row["time_ratio"] = record["time"] / max(old["time"], 1e-12)
+            row["memory_ratio"] = record["peak_memory"] / max(old["peak_memory"], 1)
+            row["base_value"] = old["value"]
+            row["value"] = record["value"]
+            if max(record["time"], old["time"]) >= min_time and (
+                row["time_ratio"] > time_threshold
+            ):
+                row["regressions"].append("time")
+            if row["memory_ratio"] > memory_threshold:
+                row["regressions"].append("memory")
+            if old["ok"] and record["ok"] is False:
+                row["regressions"].append("accuracy")
+        rows.append(row)
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Compare benchmark results of two revisions."
+    )
+    parser.add_argument("base", help="JSON report of the reference revision")
+    parser.add_argument("new", help="JSON report of the revision under test")
+    parser.add_argument("--time-threshold", type=float, default=1.25)
+    parser.add_argument("--memory-threshold", type=float, default=1.25)
+    parser.add_argument("--min-time", type=float, default=0.01)
+    args = parser.parse_args(argv)
+
+    with open(args.base) as file:
+        base = json.load(file)
+    with open(args.new) as file:
+        new = json.load(file)
+    rows = compare_reports(
+        base,
+        new,
+        time_threshold=args.time_threshold,
+        memory_threshold=args.memory_threshold,
+        min_time=args.min_time,
+    )
+
+    print(f"base: {base['meta']['revision']}\nnew:  {new['meta']['revision']}")
+    for row in rows:
+        head = f"{row['case']:<26} {row['size']:>10}"
+        if "time_ratio" not in row:
+            print(f"{head}  {', '.join(row['regressions']) or 'error in both'}")
+            continue
+        print(
+            f"{head}  time x{row['time_ratio']:.2f}  memory x{row['memory_ratio']:.2f}"
+            f"  value {row['base_value']:.4f} -> {row['value']:.4f}"
+            f"  {', '.join(row['regressions']).upper()}"
+        )
+    return 1 if any(row["regressions"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+from typing import Optional
+
+import numpy as np
+from scipy.optimize import brentq  # type: ignore
+from scipy.signal import lfilter  # type: ignore
+from scipy.special import gammaln  # type: ignore
+
+
+def fgn(n: int, hurst: float, seed: Optional[int] = None) -> np.ndarray:
+    """Generate fractional Gaussian noise (Davies-Harte method).
+
+    Input:
+        n:
+            Length of the series.
+        hurst:
+            Hurst exponent, 0 < hurst < 1.
+        seed:
+            Seed of the random number generator.
+
+    Output:
+        One dimensional ndarray with unit variance fGn. Its cumulative sum
+        is fractional Brownian motion.
+    """
+    rng = np.random.default_rng(seed)
+    lags = np.arange(n + 1, dtype=float)
+    acov = 0.5 * (
+        (lags + 1) ** (2 * hurst)
+        - 2 * lags ** (2 * hurst)
+        + np.abs(lags - 1) ** (2 * hurst)
+    )
+    # eigenvalues of the circulant embedding of the covariance matrix
+    eig = np.fft.rfft(np.concatenate((acov, acov[-2:0:-1]))).real
+    eig = np.concatenate((eig, eig[-2:0:-1]))
+    noise = rng.standard_normal(2 * n) + 1j * rng.standard_normal(2 * n)
+    return np.fft.fft(np.sqrt(np.maximum(eig, 0) / (2 * n)) * noise)[:n].real
+
+
+def binomial_cascade(n: int, p: float, seed: Optional[int] = None) -> np.ndarray:
+    """Generate binomial multiplicative cascade with random orientation.
+
+    Input:
+        n:
+            Length of the series. The cascade is generated for the nearest
+            larger power of two and truncated.
+        p:
+            Fraction of the measure passed to one of the halves,
+            0 < p < 0.5.
+        seed:
+            Seed of the random number generator.
+
+    Output:
+        One dimensional ndarray with the measure of the cascade cells. The
+        generalized Hurst exponent is given by `cascade_hurst`.
+    """
+    rng = np.random.default_rng(seed)
+    measure = np.ones(1)
+    for _ in range(max(int(np.ceil(np.log2(n))), 0)):
+        weights = np.where(rng.random(len(measure)) < 0.5, p, 1 - p)
+        measure = np.column_stack((measure * weights, measure * (1 - weights)))
+        measure = measure.ravel()
+    return measure[:n] * len(measure)
+
+
+def cascade_hurst(q: np.ndarray, p: float) -> np.ndarray:
+    """Generalized Hurst exponent h(q) of the binomial cascade."""
+    q = np.asarray(q, dtype=float)
+    return (1 - np.log2(p**q + (1 - p) ** q)) / q
+
+
+def cir(
+    n: int,
+    kappa: float,
+    sigma: float,
+    dim: int = 4,
+    dt: float = 0.01,
+    seed: Optional[int] = None,
+) -> np.ndarray:
+    """Generate Cox-Ingersoll-Ross process.
+
+    The process is obtained as a sum of squares of `dim` independent
+    Ornstein-Uhlenbeck processes, which are sampled exactly. It satisfies
+
+        dx = kappa * (theta - x) dt + sigma * sqrt(x) dW,
+
+    with theta = dim * sigma**2 / (4 * kappa).
+
+    Input:
+        n:
+            Length of the series.
+        kappa:
+            Relaxation rate.
+        sigma:
+            Noise intensity.
+        dim:
+            Number of Ornstein-Uhlenbeck processes (sets theta).
+        dt:
+            Sampling period.
+        seed:
+            Seed of the random number generator.
+
+    Output:
+        One dimensional ndarray.
+    """
+    rng = np.random.default_rng(seed)
+    decay = np.exp(-0.5 * kappa * dt)
+    # stationary variance of each Ornstein-Uhlenbeck component
+    var = sigma**2 / (4 * kappa)
+    series = np.zeros(n)
+    for _ in range(dim):
+        noise = np.sqrt(var * (1 - decay**2)) * rng.standard_normal(n)
+        noise[0] = np.sqrt(var) * rng.standard_normal()
+        series += lfilter([1.0], [1.0, -decay], noise) ** 2
+    return series
+
+
+# length of the blocks scanned side by side by `__affine_scan`
+__SCAN_BLOCK = 16
+
+
+def __affine_scan(gain: np.ndarray, shift: np.ndarray, initial: float) -> np.ndarray:
+    # y[t] = gain[t] * y[t-1] + shift[t] with y[-1] = initial. Blocks of the
+    # series are scanned side by side starting from zero, the values at the
+    # block ends follow the same recursion and are obtained recursively.
+    n = len(gain)
+    if n <= __SCAN_BLOCK:
+        out = np.empty(n)
+        for i in range(n):
+            initial = gain[i] * initial + shift[i]
+            out[i] = initial
+        return out
+    n_blocks = -(-n // __SCAN_BLOCK)
+    pad = n_blocks * __SCAN_BLOCK - n
+    gain = np.concatenate((gain, np.ones(pad))).reshape(n_blocks, -1)
+    shift = np.concatenate((shift, np.zeros(pad))).reshape(n_blocks, -1)
+    local = np.empty(gain.shape)
+    total_gain = np.empty(gain.shape)
+    local[:, 0] = shift[:, 0]
+    total_gain[:, 0] = gain[:, 0]
+    for j in range(1, __SCAN_BLOCK):
+        local[:, j] = gain[:, j] * local[:, j - 1] + shift[:, j]
+        total_gain[:, j] = gain[:, j] * total_gain[:, j - 1]
+    ends = __affine_scan(total_gain[:, -1], local[:, -1], initial)
+    starts = np.concatenate(([initial], ends[:-1]))
+    return (local + total_gain * starts[:, None]).ravel()[:n]
+
+
+def arch(
+    n: int,
+    omega: float,
+    alpha: float,
+    seed: Optional[int] = None,
+    chunk_size: int = 2**20,
+) -> np.ndarray:
+    """Generate ARCH(1) process.
+
+        x[t] = sqrt(omega + alpha * x[t-1]**2) * z[t],
+
+    where z are standard normal variables. Tail exponent of the stationary
+    distribution is given by `arch_tail_exponent`.
+
+    Squares of the process follow a linear recursion with random
+    coefficients, x[t]**2 = alpha * z[t]**2 * x[t-1]**2 + omega * z[t]**2,
+    which is solved by a vectorized scan, `chunk_size` values at a time.
+    """
+    rng = np.random.default_rng(seed)
+    series = np.empty(n)
+    prev = 0.0
+    for start in range(0, n, chunk_size):
+        noise = rng.standard_normal(min(chunk_size, n - start))
+        noise_sq = noise * noise
+        squares = __affine_scan(alpha * noise_sq, omega * noise_sq, prev)
+        prev_squares = np.concatenate(([prev], squares[:-1]))
+        series[start : start + len(noise)] = (
+            np.sqrt(omega + alpha * prev_squares) * noise
+        )
+        prev = squares[-1]
+    return series
+
+
+def arch_tail_exponent(alpha: float) -> float:
+    """Tail exponent of ARCH(1) process with normal innovations.
+
+    Exponent solves E[(alpha * z**2)**(k/2)] = 1 (Kesten's theorem).
+    """
+
+    def _log_moment(k):
+        return (
+            0.5 * k * np.log(2 * alpha) + gammaln(0.5 * (k + 1)) - 0.5 * np.log(np.pi)
+        )
+
+    return brentq(_log_moment, 1e-6, 1e3)
+
+
+def renewal_durations(n: int, alpha: float, seed: Optional[int] = None) -> np.ndarray:
+    """Generate integer valued Pareto distributed durations.
+
+    P(duration >= d) = d**(-alpha) for integer d >= 1, hence
+    P(duration = 1) = 1 - 2**(-alpha).
+    """
+    rng = np.random.default_rng(seed)
+    return np.floor(rng.random(n) ** (-1 / alpha)).astype(np.int64)
+
+
+def bursty_series(n: int, alpha: float, seed: Optional[int] = None) -> np.ndarray:
+    """Generate series of alternating bursts and inter-burst periods.
+
+    Durations of both are drawn from `renewal_durations`. Values within
+    bursts are above 1, values within inter-burst periods are below 1, so
+    burst durations extracted with threshold 1 follow P(d >= x) = x**(-alpha).
+    """
+    rng = np.random.default_rng(seed)
+    durations = renewal_durations(n, alpha, seed=rng.integers(2**63))
+    # n periods are always enough, as every one of them lasts at least 1
+    ends = np.cumsum(durations)
+    n_periods = np.searchsorted(ends, n) + 1
+    state = np.repeat(np.arange(n_periods) % 2, durations[:n_periods])[:n]
+    return np.where(state == 0, 1 + rng.exponential(1, n), rng.random(n))
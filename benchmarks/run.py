@@ -0,0 +1,384 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import scipy  # type: ignore
+
+from ..burstACS import ExtractBurstData
+from ..cdf import make_cdf
+from ..higuchi import higuchi_dimension
+from ..histogram import right_histogram
+from ..hurst import RescaledRange
+from ..kramers_moyal import get_km
+from ..mfdfa import MakeMfDfa, MakeMfDfaPanel
+from ..pdf import make_log_pdf
+from ..pmf import make_pmf
+from ..psd import make_log_psd_panel, make_seg_log_psd
+from . import generators
+
+HURST = 0.7
+CASCADE_P = 0.3
+CIR_KAPPA = 1.0
+CIR_SIGMA = 0.5
+CIR_DT = 0.1
+ARCH_OMEGA = 1.0
+ARCH_ALPHA = 0.5
+BURST_ALPHA = 1.5
+# length of the series in panel cases, the data is split into such series
+PANEL_LEN = 1000
+
+# Synthetic data sets, (size, seed) -> series
+DATA: Dict[str, Callable[[int, int], np.ndarray]] = {
+    "fgn": lambda size, seed: generators.fgn(size, HURST, seed),
+    "fbm": lambda size, seed: np.cumsum(generators.fgn(size, HURST, seed)),
+    "cascade": lambda size, seed: generators.binomial_cascade(size, CASCADE_P, seed),
+    "cir": lambda size, seed: generators.cir(
+        size, CIR_KAPPA, CIR_SIGMA, dt=CIR_DT, seed=seed
+    ),
+    "arch": lambda size, seed: generators.arch(size, ARCH_OMEGA, ARCH_ALPHA, seed),
+    "bursty": lambda size, seed: generators.bursty_series(size, BURST_ALPHA, seed),
+    "durations": lambda size, seed: generators.renewal_durations(
+        size, BURST_ALPHA, seed
+    ),
+}
+
+
+def __scales(size: int, low: int = 10, points: int = 20) -> np.ndarray:
+    return np.unique(
+        np.logspace(np.log10(low), np.log10(size // 10), points).astype(int)
+    )
+
+
+def __panel(series: np.ndarray) -> np.ndarray:
+    return series[: len(series) // PANEL_LEN * PANEL_LEN].reshape(-1, PANEL_LEN)
+
+
+def __log_slope(xy: np.ndarray, low: float = -np.inf, high: float = np.inf) -> float:
+    # slope of log-log curve over [low, high] range of its abscissa
+    mask = (xy[:, 0] >= low) & (xy[:, 0] <= high) & (xy[:, 0] > 0) & (xy[:, 1] > 0)
+    return np.polyfit(np.log(xy[mask, 0]), np.log(xy[mask, 1]), 1)[0]
+
+
+def __alpha_from_unit_fraction(durations: np.ndarray) -> float:
+    # P(d = 1) = 1 - 2**(-alpha) for integer Pareto durations
+    return -np.log2(1 - np.mean(np.asarray(durations) == 1))
+
+
+def __km_slope(km: np.ndarray, series: np.ndarray) -> float:
+    # drift is linear, fit it over the well populated bins
+    low, high = np.quantile(series, [0.05, 0.95])
+    mask = (km[:, 0] >= low) & (km[:, 0] <= high) & np.isfinite(km[:, 1])
+    return np.polyfit(km[mask, 0], km[mask, 1], 1)[0]
+
+
+def __pdf_tail_slope(pdf: np.ndarray, series: np.ndarray) -> float:
+    # power law tail of ARCH is approached slowly, slope is underestimated;
+    # the sparsely populated bins beyond the 0.9999 quantile dominate the
+    # noise of the fit and are left out
+    low, high = np.quantile(np.abs(series), [0.99, 0.9999])
+    return __log_slope(pdf, low=low, high=high)
+
+
+def __histogram_variance(histogram: tuple) -> float:
+    # right-inclusive bins: k-th bin is (edges[k-1], edges[k]], the first one
+    # holds values equal to edges[0]
+    probs, edges = histogram
+    centers = np.concatenate((edges[:1], 0.5 * (edges[1:] + edges[:-1])))
+    return np.sum(probs * centers**2)
+
+
+# Benchmark cases: estimator is timed, statistic maps its result (and the
+# input data) to a scalar, which is compared with the known value. Finite
+# size effects dominate for short series, so the comparison is made only
+# for sizes of at least `check_size`.
+CASES: Dict[str, dict] = {
+    "MakeMfDfa/fgn": {
+        "data": "fgn",
+        "estimator": lambda x: MakeMfDfa(x, [2], __scales(len(x))),
+        "statistic": lambda hq, x: hq[0],
+        "expected": HURST,
+        "tolerance": 0.05,
+        "check_size": 10**4,
+    },
+    "MakeMfDfa/cascade": {
+        "data": "cascade",
+        "estimator": lambda x: MakeMfDfa(x, [2], __scales(len(x))),
+        "statistic": lambda hq, x: hq[0],
+        "expected": float(generators.cascade_hurst(2, CASCADE_P)),
+        "tolerance": 0.1,
+        "check_size": 10**4,
+    },
+    "RescaledRange/fgn": {
+        "data": "fgn",
+        "estimator": lambda x: RescaledRange(x, 10, len(x) // 10),
+        "statistic": lambda hurst, x: hurst,
+        "expected": HURST,
+        "tolerance": 0.1,
+        "check_size": 10**4,
+    },
+    "MakeMfDfaPanel/fgn": {
+        "data": "fgn",
+        "estimator": lambda x: MakeMfDfaPanel(__panel(x), [2], __scales(PANEL_LEN)),
+        "statistic": lambda hq, x: np.mean(hq[:, 0]),
+        "expected": HURST,
+        "tolerance": 0.05,
+        "check_size": 10**5,
+    },
+    "higuchi_dimension/fbm": {
+        "data": "fbm",
+        "estimator": lambda x: higuchi_dimension(x, __scales(len(x), low=1)),
+        "statistic": lambda dim, x: dim,
+        "expected": 2 - HURST,
+        "tolerance": 0.05,
+        "check_size": 10**4,
+    },
+    "ExtractBurstData/bursty": {
+        "data": "bursty",
+        "estimator": lambda x: ExtractBurstData(x, 1.0),
+        "statistic": lambda bursts, x: __alpha_from_unit_fraction(bursts[0]),
+        "expected": BURST_ALPHA,
+        "tolerance": 0.1,
+        "check_size": 10**4,
+    },
+    "get_km/cir": {
+        "data": "cir",
+        "estimator": lambda x: get_km(1, 50, x, CIR_DT),
+        "statistic": __km_slope,
+        "expected": (np.exp(-CIR_KAPPA * CIR_DT) - 1) / CIR_DT,
+        "tolerance": 0.1,
+        "check_size": 10**5,
+    },
+    "make_seg_log_psd/fgn": {
+        "data": "fgn",
+        "estimator": lambda x: make_seg_log_psd(x),
+        "statistic": lambda psd, x: __log_slope(psd),
+        "expected": 1 - 2 * HURST,
+        "tolerance": 0.1,
+        "check_size": 10**5,
+    },
+    "make_log_psd_panel/fgn": {
+        "data": "fgn",
+        "estimator": lambda x: make_log_psd_panel(__panel(x)),
+        "statistic": lambda psds, x: __log_slope(np.mean(psds, axis=0)),
+        "expected": 1 - 2 * HURST,
+        "tolerance": 0.1,
+        "check_size": 10**5,
+    },
+    "make_log_pdf/arch": {
+        "data": "arch",
+        "estimator": lambda x: make_log_pdf(np.abs(x)[x != 0]),
+        "statistic": __pdf_tail_slope,
+        "expected": -generators.arch_tail_exponent(ARCH_ALPHA) - 1,
+        # slope is biased by 0.43 with run-to-run deviation of 0.09 (60
+        # seeds of size 10**6, 0.42 and 0.07 for size 10**7)
+        "tolerance": 0.75,
+        "check_size": 10**6,
+    },
+    "make_cdf/arch": {
+        "data": "arch",
+        "estimator": lambda x: make_cdf(x),
+        "statistic": lambda cdf, x: np.interp(0, cdf[:, 0], cdf[:, 1]),
+        "expected": 0.5,
+        "tolerance": 0.02,
+        "check_size": 10**4,
+    },
+    "right_histogram/arch": {
+        "data": "arch",
+        "estimator": lambda x: right_histogram(x),
+        "statistic": lambda hist, x: __histogram_variance(hist),
+        "expected": ARCH_OMEGA / (1 - ARCH_ALPHA),
+        "tolerance": 0.2,
+        "check_size": 10**5,
+    },
+    "make_pmf/durations": {
+        "data": "durations",
+        "estimator": lambda x: make_pmf(x),
+        "statistic": lambda pmf, x: -np.log2(1 - pmf[pmf[:, 0] == 1, 1][0]),
+        "expected": BURST_ALPHA,
+        "tolerance": 0.1,
+        "check_size": 10**4,
+    },
+}
+
+
+def __revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def __measure(case: dict, series: np.ndarray, repeat: int) -> dict:
+    # wall time is taken without tracemalloc, which slows allocations down,
+    # peak memory is measured in a separate run
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = case["estimator"](series)
+        times.append(time.perf_counter() - start)
+        del result
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = case["estimator"](series)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    value = float(case["statistic"](result, series))
+    ok = None
+    if len(series) >= case["check_size"]:
+        ok = bool(abs(value - case["expected"]) <= case["tolerance"])
+    return {
+        "time": min(times),
+        "times": times,
+        "peak_memory": peak,
+        "value": value,
+        "ok": ok,
+    }
+
+
+def run_benchmarks(
+    sizes: List[int],
+    cases: Optional[List[str]] = None,
+    repeat: int = 3,
+    seed: int = 0,
+    log: Optional[Callable[[str], None]] = None,
+) -> dict:
+    """Run benchmark cases for all input sizes.
+
+    Input:
+        sizes:
+            Lengths of the synthetic series.
+        cases:
+            Names of the cases to run (keys of `CASES`). All cases are run
+            if not given.
+        repeat:
+            Number of timed runs, the best time is reported.
+        seed:
+            Seed of the data generators.
+        log:
+            Optional callback receiving progress messages.
+
+    Output:
+        Dictionary with run metadata ("meta") and list of records
+        ("results"), one per case and size.
+    """
+    if cases is None:
+        cases = list(CASES)
+    results = []
+    for size in sizes:
+        # data sets are shared by the cases of the same size
+        data: Dict[str, np.ndarray] = {}
+        for name in cases:
+            case = CASES[name]
+            record = {
+                "case": name,
+                "size": int(size),
+                "seed": seed,
+                "expected": float(case["expected"]),
+                "tolerance": case["tolerance"],
+            }
+            try:
+                if case["data"] not in data:
+                    data[case["data"]] = DATA[case["data"]](size, seed)
+                record.update(__measure(case, data[case["data"]], repeat))
+            except (MemoryError, ValueError, np.linalg.LinAlgError) as err:
+                record.update({"ok": False, "error": f"{type(err).__name__}: {err}"})
+            results.append(record)
+            if log is not None:
+                log(__format_record(record))
+        del data
+    return {
+        "meta": {
+            "revision": __revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "scipy": scipy.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+__CHECK_LABELS = {True: "ok", False: "FAIL", None: "-"}
+
+
+def __format_record(record: dict) -> str:
+    head = f"{record['case']:<26} {record['size']:>10}"
+    if "error" in record:
+        return f"{head}  {record['error']}"
+    return (
+        f"{head} {record['time']:>10.4f}s {record['peak_memory'] / 2**20:>10.1f}MiB"
+        f"  value {record['value']:.4f} (expected {record['expected']:.4f})"
+        f"  {__CHECK_LABELS[record['ok']]}"
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark estimators on seeded synthetic data."
+    )
+    parser.add_argument("--min-size", type=float, default=1e3)
+    parser.add_argument(
+        "--max-size",
+        type=float,
+        default=1e6,
+        help="largest input size (sizes are powers of ten, up to 1e8)",
+    )
+    parser.add_argument(
+        "--cases",
+        default=None,
+        help="regular expression selecting the cases to run",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--output", default=None, help="JSON file (default: bench_<revision>.json)"
+    )
+    parser.add_argument("--list", action="store_true", help="list cases and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print("\n".join(CASES))
+        return 0
+    cases = list(CASES)
+    if args.cases is not None:
+        cases = [name for name in cases if re.search(args.cases, name)]
+    low = int(np.ceil(np.log10(args.min_size)))
+    high = int(np.floor(np.log10(min(args.max_size, 1e8))))
+    sizes = [10**k for k in range(low, high + 1)]
+
+    report = run_benchmarks(
+        sizes, cases=cases, repeat=args.repeat, seed=args.seed, log=print
+    )
+    output = args.output
+    if output is None:
+        output = f"bench_{(report['meta']['revision'] or 'unknown')[:12]}.json"
+    with open(output, "w") as file:
+        json.dump(report, file, indent=1)
+    print(f"Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
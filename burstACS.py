@@ -7,96 +7,357 @@
 
 import numpy as np
 
+from .profiling import stage
+from .series_input import is_out_of_core, iter_chunks
+
 #
 # Prepend and append series with fake data so that first and last bursts
 # do not become lost
 #
+def __PrepHead(first,thresh,delta=1):
+    if(first<thresh):
+        return np.array([thresh-delta,thresh+delta])
+    return np.array([thresh+delta,thresh-delta])
+
+def __PrepTail(last,thresh,delta=1):
+    if(last<thresh):
+        return np.array([thresh+delta,thresh-delta])
+    return np.array([thresh-delta,thresh+delta])
+
 def __PrepSeries(s,thresh,delta=1):
-    series=s.copy()
-    if(series[0]<thresh):
-        series=np.append([thresh-delta,thresh+delta],series)
-    else:
-        series=np.append([thresh+delta,thresh-delta],series)
-    if(series[-1]<thresh):
-        series=np.append(series,[thresh+delta,thresh-delta])
-    else:
-        series=np.append(series,[thresh-delta,thresh+delta])
-    return series
+    return np.concatenate((__PrepHead(s[0],thresh,delta),s,
+                           __PrepTail(s[-1],thresh,delta)))
 
 #
-# Various stats extraction functions
+# Segmented reductions over burst boundaries
 #
-def __ExtractBurstMax(s,bst,bd,tr):
-    def _peak(s,fr,n,tr):
-        return np.max(s[fr:fr+n]-tr)
-    return np.array([_peak(s,bst[i],bd[i],tr)
-                    for i in range(len(bst))])
-
-def __ExtractBurstSize(s,bst,bd,tr,dt):
-    def _size(s,fr,n,tr,h):
-        return np.sum(s[fr:fr+n]-tr)*h
-    return np.array([_size(s,bst[i],bd[i],tr,dt)
-                    for i in range(len(bst))])
-
-def __ExtractIBurstMin(s,bst,ibd,tr):
-    def _ipeak(s,to,n,tr):
-        return np.max(tr-s[to-n:to])
-    return np.array([_ipeak(s,bst[i],ibd[i],tr)
-                    for i in np.arange(1,len(bst)-1)])
-
-def __ExtractIBurstSize(s,bst,ibd,tr,dt):
-    def _isize(s,to,n,tr,h):
-        return np.sum(tr-s[to-n:to])*h
-    return np.array([_isize(s,bst[i],ibd[i],tr,dt)
-                    for i in np.arange(1,len(bst)-1)])
+def __SegmentExtreme(ufunc,a,starts,lengths):
+    # starts and ends are interleaved, so every second reduction runs over
+    # one of the segments
+    if(len(starts)==0):
+        return np.zeros(0)
+    idx=np.empty(2*len(starts),dtype=int)
+    idx[0::2]=starts
+    idx[1::2]=starts+lengths
+    if(idx[-1]==len(a)):
+        idx=idx[:-1]
+    return ufunc.reduceat(a,idx)[0::2]
+
+def __SegmentSum(a,starts,lengths):
+    # np.add.reduceat sums sequentially and would differ from np.sum in the
+    # last digits, so segments of equal length are gathered and summed row
+    # by row instead
+    sums=np.zeros(len(starts))
+    order=np.argsort(lengths,kind="stable")
+    groups=np.flatnonzero(np.diff(lengths[order]))+1
+    windows=np.lib.stride_tricks.sliding_window_view
+    for sel in np.split(order,groups):
+        if(len(sel)==0):
+            continue
+        sums[sel]=np.sum(windows(a,lengths[sel[0]])[starts[sel]],axis=1)
+    return sums
 
 #
-# The main public extraction function
+# Various stats extraction functions
 #
-def ExtractBurstData(ser,thresh,samplePeriod=1,returnBurst=True,
-                     returnInterBurst=False,extractOther=False,
-                     prepSeries=False):
-    if((not returnBurst) and (not returnInterBurst)):
-        raise ValueError("The function will not return anything")
-    rez=()
-
-    series=ser.copy().astype(float)
-    if(prepSeries):
-        series=__PrepSeries(series,thresh=thresh,delta=0.1*thresh)
+def __ExtractBurstStats(s,bst,bd,ibd,tr,dt):
+    # all statistics are obtained from a single array of deviations from
+    # the threshold; note that tr-s==-(s-tr) holds exactly in floating point
+    above=s-tr
+    ist=bst[1:-1]-ibd[1:-1]
+    return {
+        "burstMax": __SegmentExtreme(np.maximum,above,bst,bd),
+        "burstSize": __SegmentSum(above,bst,bd)*dt,
+        "interBurstMin": -__SegmentExtreme(np.minimum,above,ist,ibd[1:-1]),
+        "interBurstSize": -__SegmentSum(above,ist,ibd[1:-1])*dt,
+    }
 
+def __BurstStructure(series,thresh):
     eventTimes=np.where(series>=thresh)[0]
     interEventPeriods=np.diff(eventTimes)
 
     iearr=np.where(interEventPeriods>1)[0]
     burstStartTimes=eventTimes[iearr[:-1]+1]
     del eventTimes
-    interBurstDuration=None
-    if(returnInterBurst):
-        interBurstDuration=interEventPeriods[iearr[:-1]]-1
+    interBurstDuration=interEventPeriods[iearr[:-1]]-1
     del interEventPeriods
-    burstDuration=None
-    if(returnBurst):
-        burstDuration=np.diff(iearr)
-    del iearr
+    burstDuration=np.diff(iearr)
+    return burstStartTimes,burstDuration,interBurstDuration
+
+#
+# The main public extraction functions
+#
+def ExtractBurstTable(ser,thresh,samplePeriod=1,prepSeries=False,
+                      extractOther=True):
+    # returns dict of columns: burst and inter-burst durations together
+    # with burst maxima, inter-burst minima and their sizes; memory-mapped
+    # arrays, .npy files and chunk iterators are processed chunk by chunk
+    if(is_out_of_core(ser)):
+        return __StreamTable(iter_chunks(ser,dtype=float),thresh,samplePeriod,
+                             prepSeries,extractOther)
+    # series is only read, so float input is used without copying
+    series=np.asarray(ser,dtype=float)
+    if(prepSeries):
+        series=__PrepSeries(series,thresh=thresh,delta=0.1*thresh)
+    with stage("burst.structure"):
+        bst,bd,ibd=__BurstStructure(series,thresh)
+    table={
+        "burstDuration": bd*samplePeriod,
+        "interBurstDuration": ibd*samplePeriod,
+    }
+    if(extractOther):
+        with stage("burst.stats"):
+            table.update(__ExtractBurstStats(series,bst,bd,ibd,thresh,
+                                             samplePeriod))
+    return table
+
+def ExtractBurstData(ser,thresh,samplePeriod=1,returnBurst=True,
+                     returnInterBurst=False,extractOther=False,
+                     prepSeries=False):
+    if((not returnBurst) and (not returnInterBurst)):
+        raise ValueError("The function will not return anything")
+    rez=()
+
+    table=ExtractBurstTable(ser,thresh,samplePeriod=samplePeriod,
+                            prepSeries=prepSeries,extractOther=extractOther)
 
     if(returnBurst):
-        rez=rez+(burstDuration*samplePeriod,)
+        rez=rez+(table["burstDuration"],)
         if(extractOther):
-            burstMax=__ExtractBurstMax(series,burstStartTimes,burstDuration,
-                                      thresh)
-            burstSize=__ExtractBurstSize(series,burstStartTimes,burstDuration,
-                                      thresh,samplePeriod)
-            rez=rez+(burstMax,)
-            rez=rez+(burstSize,)
+            rez=rez+(table["burstMax"],)
+            rez=rez+(table["burstSize"],)
     if(returnInterBurst):
-        rez=rez+(interBurstDuration*samplePeriod,)
+        rez=rez+(table["interBurstDuration"],)
         if(extractOther):
-            interBurstMin=__ExtractIBurstMin(series,burstStartTimes,
-                                            interBurstDuration,thresh)
-            interBurstSize=__ExtractIBurstSize(series,burstStartTimes,
-                                            interBurstDuration,thresh,
-                                            samplePeriod)
-            rez=rez+(interBurstMin,)
-            rez=rez+(interBurstSize,)
+            rez=rez+(table["interBurstMin"],)
+            rez=rez+(table["interBurstSize"],)
 
     return rez
+
+#
+# Multi-threshold sweep: level crossings for all thresholds are obtained
+# from a single pass over the series
+#
+def __LevelCrossings(series,sortedThresh):
+    # pair (i-1,i) crosses every threshold in (low,high] interval, which
+    # corresponds to a contiguous range of sorted thresholds
+    low=np.minimum(series[:-1],series[1:])
+    high=np.maximum(series[:-1],series[1:])
+    first=np.searchsorted(sortedThresh,low,side="right")
+    counts=np.searchsorted(sortedThresh,high,side="right")-first
+    del low, high
+    pairs=np.flatnonzero(counts)
+    counts=counts[pairs]
+    first=first[pairs]
+    # expand to (threshold, position) records
+    nCrossings=np.sum(counts)
+    shift=np.arange(nCrossings)-np.repeat(np.cumsum(counts)-counts,counts)
+    thrIdx=np.repeat(first,counts)+shift
+    position=np.repeat(pairs+1,counts)
+    isUp=np.repeat(series[pairs+1]>series[pairs],counts)
+    return thrIdx,position,isUp
+
+def ExtractBurstSweep(ser,thresholds,samplePeriod=1,extractOther=False):
+    # Returns dict of columns for all thresholds. Records of i-th threshold
+    # are stored in [offsets[i]:offsets[i+1]] (durations, burst maxima and
+    # sizes) and [otherOffsets[i]:otherOffsets[i+1]] (inter-burst minima and
+    # sizes). Durations and extrema are identical to ExtractBurstTable,
+    # sizes are obtained from prefix sums and may differ in last digits.
+    series=np.asarray(ser,dtype=float)
+    thresholds=np.asarray(thresholds,dtype=float)
+    nThresh=len(thresholds)
+    order=np.argsort(thresholds,kind="stable")
+    sortedThresh=thresholds[order]
+    with stage("burst.crossings"):
+        thrIdx,position,isUp=__LevelCrossings(series,sortedThresh)
+    # runs above the threshold touching the edges of the series
+    headRuns=np.flatnonzero(sortedThresh<=series[0])
+    tailRuns=np.flatnonzero(sortedThresh<=series[-1])
+    thrIdx=np.concatenate((thrIdx,headRuns,tailRuns))
+    position=np.concatenate((position,np.zeros(len(headRuns),dtype=int),
+                             np.full(len(tailRuns),len(series))))
+    isUp=np.concatenate((isUp,np.ones(len(headRuns),dtype=bool),
+                         np.zeros(len(tailRuns),dtype=bool)))
+    # records are grouped by the original threshold index and ordered in
+    # time; within each group up and down crossings alternate
+    key=order[thrIdx]
+    perm=np.lexsort((position,key))
+    key=key[perm]
+    position=position[perm]
+    isUp=isUp[perm]
+    runKey=key[isUp]
+    runStart=position[isUp]
+    runEnd=position[~isUp]
+    del key, position, isUp, perm
+    # first and last runs of every threshold are not bursts
+    newGroup=np.concatenate(([True],runKey[1:]!=runKey[:-1]))
+    lastInGroup=np.concatenate((newGroup[1:],[True]))
+    burst=np.flatnonzero(~newGroup & ~lastInGroup)
+    bKey=runKey[burst]
+    bst=runStart[burst]
+    bd=runEnd[burst]-bst
+    gst=runEnd[burst-1]
+    ibd=bst-gst
+    offsets=np.concatenate(([0],np.cumsum(np.bincount(bKey,minlength=nThresh))))
+    sweep={
+        "offsets": offsets,
+        "burstDuration": bd*samplePeriod,
+        "interBurstDuration": ibd*samplePeriod,
+    }
+    if(not extractOther):
+        return sweep
+    # statistics of the first and the last inter-burst are not reported
+    firstBurst=np.concatenate(([True],bKey[1:]!=bKey[:-1]))
+    lastBurst=np.concatenate((firstBurst[1:],[True]))
+    other=np.flatnonzero(~firstBurst & ~lastBurst)
+    sweep["otherOffsets"]=np.concatenate(
+        ([0],np.cumsum(np.bincount(bKey[other],minlength=nThresh))))
+    bThresh=thresholds[bKey]
+    sweep["burstMax"]=__SegmentExtreme(np.maximum,series,bst,bd)-bThresh
+    sweep["interBurstMin"]=(bThresh-__SegmentExtreme(np.minimum,series,gst,
+                                                     ibd))[other]
+    center=np.mean(series)
+    sums=np.concatenate(([0],np.cumsum(series-center)))
+    sweep["burstSize"]=((sums[bst+bd]-sums[bst])
+                        +(center-bThresh)*bd)*samplePeriod
+    sweep["interBurstSize"]=-((sums[bst]-sums[gst])
+                              +(center-bThresh)*ibd)[other]*samplePeriod
+    return sweep
+
+#
+# Streaming extraction: chunks are processed one after another. Chunks are
+# split into intervals above (or at) and below the threshold; only the
+# statistics of the still open interval, the last complete burst and the
+# last two gaps are carried over to the next chunk. Run i (counting from 0)
+# is a burst once gap i+1 completes, statistics of gap i are reported once
+# gap i+2 completes (first and last inter-burst are not reported).
+#
+def __NoIntervals(extractOther):
+    intervals={"above": np.zeros(0,dtype=bool),"len": np.zeros(0,dtype=int)}
+    if(extractOther):
+        intervals["ext"]=np.zeros(0)
+        intervals["size"]=np.zeros(0)
+    return intervals
+
+def __SplitIntervals(chunk,thresh,extractOther):
+    isAbove=chunk>=thresh
+    starts=np.concatenate(([0],np.flatnonzero(isAbove[1:]!=isAbove[:-1])+1))
+    lengths=np.diff(np.append(starts,len(chunk)))
+    intervals={"above": isAbove[starts],"len": lengths}
+    if(extractOther):
+        # maxima of the runs above, minima of the runs below the threshold
+        above=chunk-thresh
+        intervals["ext"]=np.where(intervals["above"],
+                                  np.maximum.reduceat(above,starts),
+                                  np.minimum.reduceat(above,starts))
+        intervals["size"]=__SegmentSum(above,starts,lengths)
+    return intervals
+
+def __JoinIntervals(first,second):
+    return {key: np.concatenate((first[key],second[key])) for key in first}
+
+def __TakeIntervals(intervals,sel):
+    return {key: intervals[key][sel] for key in intervals}
+
+def __ContinueOpen(intervals,opened):
+    # first interval of the chunk either continues the open one or follows it
+    if(len(opened["len"])==0):
+        return intervals
+    if(opened["above"][0]!=intervals["above"][0]):
+        return __JoinIntervals(opened,intervals)
+    intervals["len"][0]+=opened["len"][0]
+    if("ext" in intervals):
+        extreme=np.maximum if intervals["above"][0] else np.minimum
+        intervals["ext"][0]=extreme(opened["ext"][0],intervals["ext"][0])
+        intervals["size"][0]=opened["size"][0]+intervals["size"][0]
+    return intervals
+
+def __StreamChunk(chunk,thresh,samplePeriod,state,extractOther):
+    intervals=__ContinueOpen(__SplitIntervals(chunk,thresh,extractOther),
+                             state["open"])
+    state["open"]=__TakeIntervals(intervals,slice(-1,None))
+    done=__TakeIntervals(intervals,slice(0,-1))
+    if(state["nRuns"]==0 and len(done["len"])>0 and (not done["above"][0])):
+        # values below the threshold preceding the first run
+        done=__TakeIntervals(done,slice(1,None))
+    newRuns=__TakeIntervals(done,done["above"])
+    newGaps=__TakeIntervals(done,~done["above"])
+    # runs[k] is run nGaps+k, gaps[k] is gap gapStart+k (counting from 1)
+    nGaps=state["nGaps"]
+    gapStart=nGaps-len(state["gaps"]["len"])+1
+    runs=__JoinIntervals(state["runs"],newRuns)
+    gaps=__JoinIntervals(state["gaps"],newGaps)
+    completed=np.arange(nGaps+1,nGaps+len(newGaps["len"])+1)
+    burst=completed[completed>=2]-1
+    bursts=__TakeIntervals(runs,burst-nGaps)
+    records={
+        "burstDuration": bursts["len"]*samplePeriod,
+        "interBurstDuration": gaps["len"][burst-gapStart]*samplePeriod,
+    }
+    if(extractOther):
+        other=completed[completed>=4]-2-gapStart
+        records["burstMax"]=bursts["ext"]
+        records["burstSize"]=bursts["size"]*samplePeriod
+        records["interBurstMin"]=-gaps["ext"][other]
+        records["interBurstSize"]=-gaps["size"][other]*samplePeriod
+    state["nRuns"]=state["nRuns"]+len(newRuns["len"])
+    state["nGaps"]=nGaps+len(completed)
+    state["runs"]=__TakeIntervals(runs,slice(len(completed),None))
+    state["gaps"]=__TakeIntervals(gaps,slice(-2,None))
+    return records
+
+def StreamBurstData(chunks,thresh,samplePeriod=1,extractOther=False,
+                    prepSeries=False):
+    # yields dicts of columns (see ExtractBurstTable) with records completed
+    # by every consumed chunk; concatenated records are identical to the
+    # output of ExtractBurstTable applied to the whole series, except that
+    # sizes of bursts and inter-bursts spanning several chunks are summed
+    # chunk by chunk (and may differ in the last digits)
+    state={
+        "open": __NoIntervals(extractOther),
+        "runs": __NoIntervals(extractOther),
+        "gaps": __NoIntervals(extractOther),
+        "nRuns": 0,
+        "nGaps": 0,
+    }
+    last=None
+    for chunk in chunks:
+        chunk=np.asarray(chunk,dtype=float)
+        if(len(chunk)==0):
+            continue
+        if(prepSeries and last is None):
+            chunk=np.concatenate((__PrepHead(chunk[0],thresh,0.1*thresh),chunk))
+        last=chunk[-1]
+        yield __StreamChunk(chunk,thresh,samplePeriod,state,extractOther)
+    if(prepSeries and last is not None):
+        yield __StreamChunk(__PrepTail(last,thresh,0.1*thresh),thresh,
+                            samplePeriod,state,extractOther)
+
+def __StreamTable(chunks,thresh,samplePeriod,prepSeries,extractOther):
+    # concatenated output of StreamBurstData, same as ExtractBurstTable
+    keys=("burstDuration","interBurstDuration")
+    if(extractOther):
+        keys=keys+("burstMax","burstSize","interBurstMin","interBurstSize")
+    columns={key: [np.zeros(0)] for key in keys}
+    for key in ("burstDuration","interBurstDuration"):
+        columns[key]=[np.zeros(0,dtype=int)*samplePeriod]
+    for records in StreamBurstData(chunks,thresh,samplePeriod=samplePeriod,
+                                   extractOther=extractOther,
+                                   prepSeries=prepSeries):
+        for key in records:
+            columns[key].append(records[key])
+    return {key: np.concatenate(columns[key]) for key in keys}
+
+def IterNpyChunks(fileName,chunkSize=2**20):
+    # iterate over memory-mapped .npy file without loading it
+    return iter_chunks(fileName,chunk_size=chunkSize)
+
+def ExtractBurstDataStream(chunks,thresh,samplePeriod=1,returnBurst=True,
+                           returnInterBurst=False,extractOther=False,
+                           prepSeries=False):
+    # same output as ExtractBurstData, but series is given as iterable of
+    # chunks (e.g., IterNpyChunks)
+    return ExtractBurstData(iter(chunks),thresh,samplePeriod=samplePeriod,
+                            returnBurst=returnBurst,
+                            returnInterBurst=returnInterBurst,
+                            extractOther=extractOther,prepSeries=prepSeries)
@@ -0,0 +1,217 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+
+def content_key(*parts: Any) -> str:
+    """Obtain hash of the given parts.
+
+    Arrays are hashed by their content (together with dtype and shape),
+    other parts by their `repr`. Hashing of a large array takes about as
+    long as reading it, so keys of large inputs should be obtained once and
+    then passed as parts of more specific keys.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            digest.update(f"{part.dtype.str}{part.shape}".encode())
+            digest.update(np.ascontiguousarray(part).data)
+        else:
+            if isinstance(part, np.generic):
+                part = part.item()
+            digest.update(repr(part).encode())
+        digest.update(b"|")
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """LRU cache of intermediate results (arrays) with bounded memory.
+
+    Input:
+        max_bytes:
+            Memory limit of the cached arrays. Least recently used arrays
+            are evicted once the limit is exceeded.
+        spill_dir:
+            Directory to which evicted arrays are written (as .npy files).
+            Spilled arrays are loaded back when they are requested again.
+            Files are kept in a private subdirectory, which is removed when
+            the cache is closed (by `close`, `disable_cache`, or once the
+            cache is garbage collected or the interpreter exits).
+        max_disk_bytes:
+            Limit of the spilled arrays. Least recently spilled arrays are
+            deleted once the limit is exceeded.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 2**30,
+        spill_dir: Optional[str] = None,
+        max_disk_bytes: int = 2**32,
+    ):
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.spill_dir = None
+        # spilled files are managed only by the process, which created the
+        # cache (forked worker processes inherit a copy of it)
+        self._pid = os.getpid()
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
+            self.spill_dir = tempfile.mkdtemp(prefix="cache-", dir=spill_dir)
+            self._finalizer = weakref.finalize(
+                self, ResultCache._remove_spill_dir, self.spill_dir, self._pid
+            )
+        self.nbytes = 0
+        self.disk_nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._spilled: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _remove_spill_dir(spill_dir: str, pid: int) -> None:
+        if os.getpid() == pid:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+
+    def _owns_spill_dir(self) -> bool:
+        return self.spill_dir is not None and os.getpid() == self._pid
+
+    def _spill_path(self, key: str) -> str:
+        return os.path.join(self.spill_dir, f"{key}.npy")
+
+    def _spill(self, key: str, value: np.ndarray) -> None:
+        if not self._owns_spill_dir() or value.nbytes > self.max_disk_bytes:
+            return
+        np.save(self._spill_path(key), value)
+        self._spilled[key] = value.nbytes
+        self.disk_nbytes += value.nbytes
+        while self.disk_nbytes > self.max_disk_bytes:
+            self._unspill(next(iter(self._spilled)))
+
+    def _unspill(self, key: str) -> None:
+        self.disk_nbytes -= self._spilled.pop(key)
+        if self._owns_spill_dir():
+            os.remove(self._spill_path(key))
+
+    def _store(self, key: str, value: np.ndarray) -> None:
+        if key in self._entries:
+            self.nbytes -= self._entries.pop(key).nbytes
+        if key in self._spilled:
+            self._unspill(key)
+        if value.nbytes > self.max_bytes:
+            self._spill(key, value)
+            return
+        self._entries[key] = value
+        self.nbytes += value.nbytes
+        while self.nbytes > self.max_bytes:
+            old_key, old_value = self._entries.popitem(last=False)
+            self.nbytes -= old_value.nbytes
+            self._spill(old_key, old_value)
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Obtain cached array (or `None` if it is not cached)."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            if key in self._spilled:
+                try:
+                    value = np.load(self._spill_path(key))
+                except FileNotFoundError:
+                    # removed by the process owning the spill directory
+                    self.disk_nbytes -= self._spilled.pop(key)
+                    self.misses += 1
+                    return None
+                value.setflags(write=False)
+                if value.nbytes > self.max_bytes:
+                    # does not fit into memory, stays on disk
+                    self._spilled.move_to_end(key)
+                else:
+                    self._store(key, value)
+                self.hits += 1
+                return value
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: Any) -> np.ndarray:
+        """Store result (converted to a read-only array) in the cache."""
+        value = np.asarray(value)
+        value.setflags(write=False)
+        with self._lock:
+            self._store(key, value)
+        return value
+
+    def clear(self) -> None:
+        """Drop cached arrays, including the spilled ones."""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+            while self._spilled:
+                self._unspill(next(iter(self._spilled)))
+
+    def close(self) -> None:
+        """Drop cached arrays and remove the spill directory."""
+        self.clear()
+        if self.spill_dir is not None:
+            self._finalizer()
+
+
+__cache: Optional[ResultCache] = None
+
+
+def enable_cache(
+    max_bytes: int = 2**30,
+    spill_dir: Optional[str] = None,
+    max_disk_bytes: int = 2**32,
+) -> ResultCache:
+    """Enable caching of intermediate results (see `ResultCache`).
+
+    Cached are detrended segment variances of MF-DFA (per profile, scale
+    and detrending order), mean rescaled ranges (per series and segment
+    size) and periodograms used by `make_log_psd`, so repeated analysis of
+    the same data with different q, scales or out_points reuses them.
+    Previously enabled cache is closed.
+    """
+    global __cache
+    disable_cache()
+    __cache = ResultCache(
+        max_bytes=max_bytes, spill_dir=spill_dir, max_disk_bytes=max_disk_bytes
+    )
+    return __cache
+
+
+def disable_cache() -> None:
+    """Disable caching, drop the cached results and their spilled files."""
+    global __cache
+    if __cache is not None:
+        __cache.close()
+    __cache = None
+
+
+def get_cache() -> Optional[ResultCache]:
+    """Obtain the active cache (`None` if caching is disabled)."""
+    return __cache
+
+
+def cached(compute: Callable[[], Any], *key: Any) -> Any:
+    """Obtain result from the active cache or compute (and store) it.
+
+    `key` parts are combined by `content_key`. If caching is disabled,
+    result is computed and returned as is.
+    """
+    cache = __cache
+    if cache is None:
+        return compute()
+    full_key = content_key(*key)
+    value = cache.get(full_key)
+    if value is None:
+        value = cache.put(full_key, compute())
+    return value
@@ -1,8 +1,9 @@
-from typing import Optional
+from typing import Optional, Tuple
 
 import numpy as np
 
-from .histogram import right_histogram
+from .histogram import HistogramAccumulator
+from .series_input import fill_range, iter_chunks
 
 
 def make_cdf(
@@ -11,14 +12,177 @@ def make_cdf(
     stop: Optional[float] = None,
     out_points: int = 100,
 ) -> np.ndarray:
-    """Extract empirical CDF on lin-lin scale."""
+    """Extract empirical CDF on lin-lin scale.
+
+    Data may be given in any form accepted by `right_histogram`.
+    """
+    start, stop = fill_range(data, start, stop)
+    accumulator = HistogramAccumulator(start, stop, out_points=out_points)
+    for chunk in iter_chunks(data):
+        accumulator.update(chunk)
+    return cdf_from_histogram(accumulator)
+
+
+def cdf_from_histogram(accumulator: HistogramAccumulator) -> np.ndarray:
+    """Extract empirical CDF from right-inclusive histogram accumulator."""
+    if not accumulator.right:
+        raise ValueError("CDF requires right-inclusive histogram")
+    histogram, edges = accumulator.histogram(density=False)
+    cdf = np.vstack([edges, np.cumsum(histogram)]).T
+    cdf[:, 1] /= np.sum(histogram)
+    return cdf
+
+
+def make_ecdf(
+    data: np.ndarray,
+    points: Optional[np.ndarray] = None,
+    survival: bool = False,
+) -> np.ndarray:
+    """Evaluate exact empirical CDF at arbitrary points.
+
+    Input:
+        data:
+            Sample values.
+        points:
+            Points at which the CDF should be evaluated. If not given, CDF is
+            evaluated at every distinct value of the sample.
+        survival:
+            Whether to return complementary CDF (survival function), which
+            is defined as P(X >= x), instead of P(X <= x). This definition
+            keeps the largest sample value on log-log plots of the tail.
+
+    Output:
+        Two dimensional ndarray. First column - points, the second column -
+        value of (complementary) CDF at those points.
+    """
+    sorted_data = np.sort(data)
+    if points is None:
+        points = np.unique(sorted_data)
+    points = np.asarray(points, dtype=float)
+    if survival:
+        probs = len(sorted_data) - np.searchsorted(sorted_data, points, side="left")
+    else:
+        probs = np.searchsorted(sorted_data, points, side="right")
+    return np.vstack([points, probs / len(sorted_data)]).T
+
+
+def make_log_ecdf(
+    data: np.ndarray,
+    start: Optional[float] = None,
+    stop: Optional[float] = None,
+    out_points: int = 100,
+    survival: bool = False,
+) -> np.ndarray:
+    """Evaluate exact empirical (complementary) CDF on log-spaced points."""
     if start is None:
         start = np.min(data)
     if stop is None:
         stop = np.max(data)
-    histogram, edges = right_histogram(
-        data, start=start, stop=stop, out_points=out_points, density=False
-    )
-    cdf = np.vstack([edges, np.cumsum(histogram)]).T
-    cdf[:, 1] /= np.sum(histogram)
-    return cdf
+    points = np.logspace(np.log10(start), np.log10(stop), num=out_points)
+    # avoid rounding errors at the end points
+    points[0] = start
+    points[-1] = stop
+    return make_ecdf(data, points=points, survival=survival)
+
+
+class QuantileSketch:
+    """Bounded-memory quantile sketch for streams too large to be sorted.
+
+    Implementation follows the KLL sketch [Z. Karnin, K. Lang, E. Liberty.
+    Optimal Quantile Approximation in Streams. FOCS 2016. arXiv: 1603.05346].
+    Items are kept in levels, an item in level h represents 2**h original
+    values. When a level exceeds its capacity, it is sorted and every other
+    item (starting from random offset) is promoted to the next level.
+
+    Input:
+        k:
+            Controls size and accuracy of the sketch. The sketch stores
+            O(k) values (at most roughly 3k), while the rank error is
+            O(1/k): for k=200 the normalized rank error (error of the
+            estimated CDF) stays below approximately 1.7% with 99%
+            probability.
+        seed:
+            Seed of the random number generator used during compaction.
+
+    Sketches sharing `k` can be combined using `merge`. Estimates can not
+    be obtained from an empty sketch (ValueError is raised).
+    """
+
+    def __init__(self, k: int = 200, seed: Optional[int] = None):
+        self.k = k
+        self.n = 0
+        self.levels = [np.zeros(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(int(np.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def _compress(self):
+        while True:
+            full = [
+                level
+                for level, items in enumerate(self.levels)
+                if len(items) > self._capacity(level)
+            ]
+            if len(full) == 0:
+                return
+            level = full[0]
+            if level + 1 == len(self.levels):
+                self.levels.append(np.zeros(0))
+            items = np.sort(self.levels[level])
+            n_even = len(items) - len(items) % 2
+            promoted = items[self._rng.integers(2) : n_even : 2]
+            self.levels[level] = items[n_even:]
+            self.levels[level + 1] = np.concatenate((self.levels[level + 1], promoted))
+
+    def update(self, data: np.ndarray) -> "QuantileSketch":
+        """Add values from the next chunk of data."""
+        data = np.asarray(data, dtype=float).ravel()
+        self.levels[0] = np.concatenate((self.levels[0], data))
+        self.n = self.n + len(data)
+        self._compress()
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """Add values summarized by other sketch."""
+        if self.k != other.k:
+            raise ValueError("Sketches must share k")
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.zeros(0))
+            self.levels[level] = np.concatenate((self.levels[level], items))
+        self.n = self.n + other.n
+        self._compress()
+        return self
+
+    def _weighted_items(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self.n == 0:
+            raise ValueError("Sketch is empty")
+        items = np.concatenate(self.levels)
+        weights = np.concatenate(
+            [np.full(len(items), 2**level) for level, items in enumerate(self.levels)]
+        )
+        order = np.argsort(items, kind="stable")
+        return items[order], np.cumsum(weights[order])
+
+    def cdf(self, points: np.ndarray, survival: bool = False) -> np.ndarray:
+        """Estimate (complementary) CDF at given points.
+
+        Output has the same format as the output of `make_ecdf`.
+        """
+        items, cum_weights = self._weighted_items()
+        cum_weights = np.concatenate(([0], cum_weights))
+        points = np.asarray(points, dtype=float)
+        if survival:
+            probs = self.n - cum_weights[np.searchsorted(items, points, side="left")]
+        else:
+            probs = cum_weights[np.searchsorted(items, points, side="right")]
+        return np.vstack([points, probs / self.n]).T
+
+    def quantile(self, probs: np.ndarray) -> np.ndarray:
+        """Estimate quantiles for given probabilities."""
+        items, cum_weights = self._weighted_items()
+        ranks = np.asarray(probs, dtype=float) * self.n
+        idx = np.searchsorted(cum_weights, ranks, side="left")
+        return items[np.minimum(idx, len(items) - 1)]
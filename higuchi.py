@@ -1,23 +1,34 @@
-import matplotlib.pyplot as plt
-import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
 
-def __rescaled_length(series, offset, scale):
-    n_full = len(series)
-    diffs = np.diff(series[offset::scale])
-    n_rescaled = len(diffs) + 1
-    sum_term = np.sum(np.abs(diffs))
-    return (n_full - 1) / (n_rescaled * (scale ** 2)) * sum_term
+from .panel import map_panel
+from .profiling import stage
 
 
 def __mean_length(series, scale):
-    return np.mean(
-        [__rescaled_length(series, offset, scale) for offset in np.arange(0, scale)]
+    # All offsets are handled at once: absolute differences at lag `scale`
+    # are padded and reshaped, so that each column holds one offset. Series
+    # are laid along the last axis, so several series can be stacked.
+    n_full = series.shape[-1]
+    diffs = np.abs(series[..., scale:] - series[..., : max(n_full - scale, 0)])
+    pad = np.zeros(diffs.shape[:-1] + ((-diffs.shape[-1]) % scale,))
+    sum_terms = np.sum(
+        np.concatenate((diffs, pad), axis=-1).reshape(
+            diffs.shape[:-1] + (-1, scale)
+        ),
+        axis=-2,
     )
+    # number of points in series[offset::scale]
+    n_rescaled = np.maximum((n_full - np.arange(scale) + scale - 1) // scale, 1)
+    return np.mean((n_full - 1) / (n_rescaled * (scale ** 2)) * sum_terms, axis=-1)
 
 
 def higuchi_dimension(
-    series: list[float], scales: list[int], plot_curves: bool = False
+    series: list[float],
+    scales: list[int],
+    plot_curves: bool = False,
+    workers: int = 1,
 ):
     """Calculate Higuchi dimension.
 
@@ -27,17 +38,31 @@ def higuchi_dimension(
         scales      - 1D list of integer numbers describing the scales at which
                       the series ought to be analysed.
         plot_curves - whether to plot the length vs 1/scale plot. (optional)
+        workers     - number of threads among which the scales are
+                      distributed. (optional)
 
     Returns:
         An estimate of Higuchi dimension. Optionally one can choose to plot
         the curves, from which the Higuchi dimension is estimated.
     """
-    log_lengths = np.log([__mean_length(series, scale) for scale in scales])
+    series = np.asarray(series, dtype=float)
+    with stage("higuchi.lengths"):
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                lengths = list(
+                    pool.map(lambda scale: __mean_length(series, scale), scales)
+                )
+        else:
+            lengths = [__mean_length(series, scale) for scale in scales]
+    log_lengths = np.log(lengths)
     log_scales = -np.log(scales)
 
-    coeffs = np.polyfit(log_scales, log_lengths, 1)
+    with stage("higuchi.fit"):
+        coeffs = np.polyfit(log_scales, log_lengths, 1)
 
     if plot_curves:
+        import matplotlib.pyplot as plt
+
         plt.figure()
         plt.xlabel("log(1/scale)")
         plt.ylabel("log(length)")
@@ -46,3 +71,37 @@ def higuchi_dimension(
         plt.show()
 
     return coeffs[0]
+
+
+def higuchi_dimension_panel(
+    panel: list[list[float]],
+    scales: list[int],
+    workers: int = 1,
+    batch_len: int = 2**22,
+):
+    """Calculate Higuchi dimension of every series in a panel.
+
+    Args:
+        panel     - 2D array (series x time) or a ragged collection of 1D
+                    series. Series of equal length are stacked and processed
+                    at once.
+        scales    - 1D list of integer numbers describing the scales at which
+                    the series ought to be analysed.
+        workers   - number of threads among which the batches of series are
+                    distributed. (optional)
+        batch_len - maximum number of values processed at once. (optional)
+
+    Returns:
+        1D array with an estimate of Higuchi dimension for every series.
+    """
+    log_scales = -np.log(scales)
+
+    def _batch_dimension(block):
+        with stage("higuchi.lengths"):
+            log_lengths = np.log([__mean_length(block, scale) for scale in scales])
+        with stage("higuchi.fit"):
+            return np.polyfit(log_scales, log_lengths, 1)[0]
+
+    return np.array(
+        map_panel(_batch_dimension, panel, workers=workers, batch_len=batch_len)
+    )
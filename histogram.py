@@ -1,8 +1,89 @@
-from collections import Counter
 from typing import Optional, Tuple
 
 import numpy as np
 
+from .profiling import stage
+from .series_input import fill_range, iter_chunks
+
+
+class HistogramAccumulator:
+    """Accumulate histogram counts over a stream of chunks.
+
+    Input:
+        start:
+            The first bin edge.
+        stop:
+            The last bin edge.
+        out_points:
+            Number of bin edges.
+        log:
+            Whether the edges should be spaced logarithmically.
+        right:
+            Whether the binning should be right-inclusive (as in
+            `right_histogram`, there are `out_points` bins, the first one
+            contains values equal to `start`). Otherwise the binning is
+            left-inclusive (as in `numpy.histogram`, there are `out_points-1`
+            bins, the last one includes `stop`).
+
+    Accumulators with identical edges can be combined using `merge`.
+    """
+
+    def __init__(
+        self,
+        start: float,
+        stop: float,
+        out_points: int = 100,
+        log: bool = False,
+        right: bool = True,
+    ):
+        self.start = start
+        self.stop = stop
+        self.log = log
+        self.right = right
+        if log:
+            self.edges = np.logspace(np.log10(start), np.log10(stop), num=out_points)
+        else:
+            self.edges = np.linspace(start, stop, num=out_points)
+        n_bins = out_points if right else out_points - 1
+        self.counts = np.zeros(n_bins, dtype=int)
+
+    def _bin_index(self, data: np.ndarray) -> np.ndarray:
+        if self.right and not self.log:
+            _data = data[(self.start <= data) & (data <= self.stop)]
+            idx = np.ceil(
+                (_data - self.start) * (len(self.edges) - 1) / (self.stop - self.start)
+            ).astype(int)
+            # rounding may push values equal to `stop` past the last bin
+            return np.minimum(idx, len(self.counts) - 1)
+        _data = data[(self.edges[0] <= data) & (data <= self.edges[-1])]
+        if self.right:
+            return np.searchsorted(self.edges, _data, side="left")
+        # the last bin is closed as in `numpy.histogram`
+        return np.minimum(
+            np.searchsorted(self.edges, _data, side="right") - 1, len(self.counts) - 1
+        )
+
+    def update(self, data: np.ndarray) -> "HistogramAccumulator":
+        """Count values from the next chunk of data."""
+        with stage("histogram.count"):
+            idx = self._bin_index(np.asarray(data))
+            self.counts += np.bincount(idx, minlength=len(self.counts))
+        return self
+
+    def merge(self, other: "HistogramAccumulator") -> "HistogramAccumulator":
+        """Add counts accumulated by other accumulator."""
+        if self.right != other.right or not np.array_equal(self.edges, other.edges):
+            raise ValueError("Accumulators must share edges and binning")
+        self.counts += other.counts
+        return self
+
+    def histogram(self, density: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        """Obtain histogram and bin edges."""
+        hist = self.counts.astype(float)
+        if density:
+            hist = hist / np.sum(self.counts)
+        return hist, self.edges
+
 
 def right_histogram(
     data: np.ndarray,
@@ -16,26 +97,14 @@ def right_histogram(
     Problem: `numpy.histogram` is left-inclusive, which doesn't align well with
     how CDF is defined. Issues arise when there is a degree of discreteness in
     the data.
+
+    Data can be also given as `np.memmap`, path to .npy file or an iterator
+    over chunks (`start` and `stop` are then required), such data is
+    processed chunk by chunk.
     """
-    if start is None:
-        start = np.min(data)
-    if stop is None:
-        stop = np.max(data)
-
-    _data = np.ceil(
-        (
-            (data[(start <= data) & (data <= stop)] - start)
-            * (out_points - 1)
-            / (stop - start)
-        )
-    ).astype(int)
-
-    counts = Counter(_data)
-    hist = np.zeros(out_points)
-    for key, val in counts.items():
-        hist[key] = val
-    if density:
-        n_samples = len(_data)
-        hist = hist / n_samples
-    edges = np.linspace(start, stop, num=out_points)
-    return hist, edges
+    start, stop = fill_range(data, start, stop)
+
+    accumulator = HistogramAccumulator(start, stop, out_points=out_points)
+    for chunk in iter_chunks(data):
+        accumulator.update(chunk)
+    return accumulator.histogram(density=density)
@@ -1,61 +1,276 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+from functools import partial
+
 import numpy as np
 
+from .cache import cached, content_key, get_cache
+from .panel import map_panel
+from .profiling import stage
+from .rolling import window_segments, window_sums
+from .series_input import (is_chunk_iterator, is_out_of_core, iter_chunks,
+                           iter_segments, load_series)
+
+def __LogLogSlope(x, y, /):
+    with stage("hurst.fit"):
+        return np.polyfit(np.log10(x), np.log10(y), 1)[0]
+
 ##
 ## Rescaled Range related functions
 ##
-def __MeanRange(series, segmentSize, /, *, wrap=True):
-    # Step 1: Splitting series into segments
-    _nSegments = len(series) // segmentSize
-    _segs = series[:_nSegments*segmentSize].reshape(_nSegments, segmentSize)
-    if wrap:
-        # wrap might be needed to account for the edge points too
-        _segs = np.vstack((_segs, series[-_nSegments*segmentSize:].reshape(_nSegments, segmentSize)))
+# raw prefix sums may exceed the centered ones this many times
+__RawSumsGrowth = 2**10
+
+def __PrefixSums(series):
+    # Prefix sums shared by all segment sizes: centered values yield segment
+    # variances and profiles. Series are laid along the last axis, so several
+    # series of equal length can be stacked.
+    with stage("hurst.profile"):
+        _series = np.asarray(series, dtype=float)
+        _mean = np.mean(_series, axis=-1, keepdims=True)
+        _centered = _series - _mean
+        _zeros = np.zeros(_series.shape[:-1] + (1,))
+        _cSums = np.concatenate((_zeros, np.cumsum(_centered, axis=-1)), axis=-1)
+        _sqSums = np.concatenate((_zeros, np.cumsum(_centered**2, axis=-1)), axis=-1)
+        # Raw prefix sums grow with the mean and lose precision. If the
+        # growth is comparable to the fluctuations of the centered sums,
+        # profiles are views of the raw sums, otherwise the drift is added
+        # back to the centered sums segment by segment, so the precision
+        # does not depend on the mean.
+        _growth = np.abs(_mean) * _series.shape[-1]
+        _small = _growth <= __RawSumsGrowth * np.max(np.abs(_cSums), axis=-1, keepdims=True)
+        _drift = np.where(_small, 0.0, _mean)
+        _sums = _cSums
+        if np.any(_small):
+            _sums = _cSums + (_mean - _drift) * np.arange(_cSums.shape[-1])
+    return _series, _sums, _drift, _cSums, _sqSums
+
+# number of profile values processed at once when the drift is added back
+__RangeBlock = 2**16
+
+def __RangeRatios(prefixSums, segmentSize, offset, nSegments, /):
+    _series, _sums, _drift, _cSums, _sqSums = prefixSums
+    # Step 1: Segment boundaries
+    _bounds = offset + segmentSize * np.arange(nSegments + 1)
     # Step 2: Obtain standard deviation for each segment
-    _stds = np.std(_segs, axis=1)
-    # Step 3: Obtain profile (cumulative sum of values in the segment)
-    _prof = np.cumsum(_segs, axis=1)
-    del _segs
-    # Step 5: Establish range
-    _low = np.min(_prof, axis=1)
-    _high = np.max(_prof, axis=1)
-    _rng = _high - _low
-    # Step 6: Calculate mean range / standard deviation
-    return np.mean(_rng / _stds)
+    _s1 = np.diff(_cSums[..., _bounds])
+    _ss = np.maximum(np.diff(_sqSums[..., _bounds]) - _s1**2 / segmentSize, 0)
+    _stds = np.sqrt(_ss / segmentSize)
+    # prefix sums lose relative precision for segments with tiny variance
+    # (compared to the accumulated sum), recalculate those directly
+    _bad = np.nonzero(_ss < 1e8 * np.finfo(float).eps * _sqSums[..., _bounds[1:]])
+    if len(_bad[-1]) > 0:
+        _idx = _bounds[_bad[-1], None] + np.arange(segmentSize)
+        _rows = tuple(_row[:, None] for _row in _bad[:-1])
+        _stds[_bad] = np.std(_series[_rows + (_idx,)], axis=-1)
+    # Step 3: Obtain profile (strided view of the prefix sums, its offset
+    # does not affect the range)
+    _prof = _sums[..., offset + 1 : offset + 1 + nSegments * segmentSize]
+    _prof = _prof.reshape(_prof.shape[:-1] + (nSegments, segmentSize))
+    # Step 4: Establish range
+    if not np.any(_drift):
+        _rng = np.max(_prof, axis=-1) - np.min(_prof, axis=-1)
+    else:
+        # blocks of segments are processed, so that profiles with the drift
+        # added back stay in cache
+        _driftProf = _drift[..., None] * np.arange(1, segmentSize + 1)
+        _rng = np.empty(_prof.shape[:-1])
+        _blockLen = max(1, __RangeBlock // (segmentSize * _drift.size))
+        for _start in range(0, nSegments, _blockLen):
+            _block = _prof[..., _start : _start + _blockLen, :] + _driftProf
+            _rng[..., _start : _start + _blockLen] = np.max(_block, axis=-1) - np.min(_block, axis=-1)
+    # Step 5: Rescale range by standard deviation
+    return _rng / _stds
+
+def __MeanRange(prefixSums, segmentSize, /, *, wrap=True):
+    _len = prefixSums[0].shape[-1]
+    _nSegments = _len // segmentSize
+    with stage("hurst.segments"):
+        _ratios = __RangeRatios(prefixSums, segmentSize, 0, _nSegments)
+        if wrap:
+            # wrap might be needed to account for the edge points too
+            _offset = _len - _nSegments * segmentSize
+            _ratios = np.concatenate((_ratios, __RangeRatios(prefixSums, segmentSize, _offset, _nSegments)), axis=-1)
+        return np.mean(_ratios, axis=-1)
 
 def __MeanRanges(series, segmentSizes, /, *, wrap=True):
-    _ranges = np.zeros(len(segmentSizes))
+    # NOTE: for stacked series ranges are returned as (sizes x series) array
+    _series = np.asarray(series, dtype=float)
+    _ranges = np.zeros((len(segmentSizes),) + _series.shape[:-1])
+    if get_cache() is None:
+        _prefixSums = __PrefixSums(_series)
+        for _idx, _segmentSize in enumerate(segmentSizes):
+            _ranges[_idx] = __MeanRange(_prefixSums, _segmentSize, wrap=wrap)
+        return _ranges
+    # mean ranges are cached per segment size, prefix sums are obtained
+    # only if some of them are missing
+    _key = content_key(_series)
+    _prefixSums = []
+    def _meanRange(segmentSize):
+        if len(_prefixSums) == 0:
+            _prefixSums.append(__PrefixSums(_series))
+        return __MeanRange(_prefixSums[0], segmentSize, wrap=wrap)
     for _idx, _segmentSize in enumerate(segmentSizes):
-        _ranges[_idx] = __MeanRange(series, _segmentSize, wrap=wrap)
+        _ranges[_idx] = cached(partial(_meanRange, _segmentSize), "hurst.meanRange", _key, int(_segmentSize), wrap)
     return _ranges
 
-def RescaledRange(series, lowSegmentSize, highSegmentSize, /, *, wrap=True, points=100):
-    # NOTE: We will work only if series is stationary (equivalent to fractional Gaussian noise)
+def __StreamMeanRanges(source, segmentSizes, /, *, wrap=True):
+    # Out-of-core variant of __MeanRanges: segments of all sizes (aligned to
+    # the start and, if wrap, to the end of the series) are collected during
+    # a single pass over the chunks, only running sums of ratios are kept
+    _sizes = list(segmentSizes)
+    _offsets = [0] * len(_sizes)
+    if wrap:
+        if is_chunk_iterator(source):
+            raise ValueError("wrap requires series of known length")
+        _len = len(load_series(source))
+        _offsets = _offsets + [_len % _segmentSize for _segmentSize in _sizes]
+        _sizes = _sizes + _sizes
+    _sums = np.zeros(len(_sizes))
+    _counts = np.zeros(len(_sizes))
+    for _blocks in iter_segments(iter_chunks(source, dtype=float), _sizes, _offsets):
+        for _idx, _segs in enumerate(_blocks):
+            if len(_segs) == 0:
+                continue
+            with stage("hurst.segments"):
+                _stds = np.std(_segs, axis=1)
+                _prof = np.cumsum(_segs, axis=1)
+                _rng = np.max(_prof, axis=1) - np.min(_prof, axis=1)
+                _sums[_idx] += np.sum(_rng / _stds)
+                _counts[_idx] += len(_segs)
+    if wrap:
+        _half = len(segmentSizes)
+        return (_sums[:_half] + _sums[_half:]) / (_counts[:_half] + _counts[_half:])
+    return _sums / _counts
+
+def __SegmentSizes(lowSegmentSize, highSegmentSize, points, /):
     _lss = np.log10(lowSegmentSize)
     _hss = np.log10(highSegmentSize)
     _segmentSizes = np.unique(np.floor(np.logspace(_lss, _hss, num = points)).astype(int))
-    _segmentSizes = _segmentSizes[ _segmentSizes > 1 ]
-    _ranges = __MeanRanges(series, _segmentSizes, wrap=wrap)
-    return np.polyfit(np.log10(_segmentSizes), np.log10(_ranges), 1)[0]
+    return _segmentSizes[ _segmentSizes > 1 ]
+
+def RescaledRange(series, lowSegmentSize, highSegmentSize, /, *, wrap=True, points=100):
+    # NOTE: We will work only if series is stationary (equivalent to fractional Gaussian noise)
+    # NOTE: memory-mapped arrays, .npy files and chunk iterators (wrap=False)
+    # are processed chunk by chunk
+    _segmentSizes = __SegmentSizes(lowSegmentSize, highSegmentSize, points)
+    if is_out_of_core(series):
+        _ranges = __StreamMeanRanges(series, _segmentSizes, wrap=wrap)
+    else:
+        _ranges = __MeanRanges(series, _segmentSizes, wrap=wrap)
+    return __LogLogSlope(_segmentSizes, _ranges)
+
+def RescaledRangePanel(panel, lowSegmentSize, highSegmentSize, /, *, wrap=True, points=100, workers=1, batchLen=2**22):
+    # NOTE: panel is (series x time) array or a ragged collection of series;
+    # series of equal length are stacked and processed at once, batches are
+    # distributed among worker threads. Returns Hurst exponent of every series
+    def _batchHurst(block):
+        _segmentSizes = __SegmentSizes(lowSegmentSize, highSegmentSize, points)
+        _ranges = __MeanRanges(block, _segmentSizes, wrap=wrap)
+        return __LogLogSlope(_segmentSizes, _ranges)
+    return np.array(map_panel(_batchHurst, panel, workers=workers, batch_len=batchLen))
+
+def RollingRescaledRange(series, window, lowSegmentSize, highSegmentSize, /, *, step=1, points=100):
+    # NOTE: returns Hurst exponent in every window series[i*step:i*step+window].
+    # Segments are aligned to a single grid over the whole series, so R/S of
+    # every segment is evaluated once and shared by all windows containing
+    # it; cost of a step does not depend on window length
+    _segmentSizes = __SegmentSizes(lowSegmentSize, highSegmentSize, points)
+    _prefixSums = __PrefixSums(series)
+    _len = _prefixSums[0].shape[-1]
+    _ranges = []
+    for _segmentSize in _segmentSizes:
+        _first, _last = window_segments(_len, window, step, _segmentSize)
+        with stage("hurst.segments"):
+            _ratios = __RangeRatios(_prefixSums, _segmentSize, 0, _len // _segmentSize)
+        with stage("hurst.windows"):
+            _ranges.append(window_sums(_ratios, _first, _last) / (_last - _first + 1))
+    return __LogLogSlope(_segmentSizes, _ranges)
 
 ##
 ## Box Counting method
 ##
-def __BoxCount1D(series, nSegments, /, *, wrap=True):
-    # NOTE: this implementation will work only for one dimensional series (e.g. Cantor set)
-    _segmentSize = len(series) // nSegments
-    _segs = series[:nSegments*_segmentSize].reshape(nSegments, _segmentSize)
+def __BoxNumbers(lowN, highN, /, *, points=100):
+    _ln = np.log10(lowN)
+    _hn = np.log10(highN)
+    _nBoxes = np.unique(np.floor(np.logspace(_ln, _hn, num = points)).astype(int))
+    return _nBoxes[ _nBoxes > 1 ]
+
+def __Occupancy1D(series):
+    # NOTE: series is treated as (non-negative) occupancy, e.g. indicator of
+    # the Cantor set. Cumulative occupancy is shared by all resolutions.
+    return np.concatenate(([0], np.cumsum(np.asarray(series) > 0)))
+
+def __BoxCount1D(occupancy, nSegments, /, *, wrap=True):
+    _len = len(occupancy) - 1
+    _segmentSize = _len // nSegments
+    _bounds = _segmentSize * np.arange(nSegments + 1)
+    _count = np.sum(np.diff(occupancy[_bounds]) > 0)
     if wrap:
         # wrap might be needed to account for the edge points too
-        _segs = np.vstack((_segs, series[-nSegments*_segmentSize:].reshape(nSegments, _segmentSize)))
-    return np.sum(np.sum(_segs,axis=1)>0) // 2
+        _bounds = _bounds + (_len - nSegments * _segmentSize)
+        _count = _count + np.sum(np.diff(occupancy[_bounds]) > 0)
+    return _count // 2
 
 def BoxCount1D(series, lowN, highN, /, *, wrap=True, points=100):
-    _ln = np.log10(lowN)
-    _hn = np.log10(highN)
-    _nBoxes = np.unique(np.floor(np.logspace(_ln, _hn, num = points)).astype(int))
-    _nBoxes = _nBoxes[ _nBoxes > 1 ]
-    _counts = np.array([__BoxCount1D(series, nb, wrap=wrap) for nb in _nBoxes])
-    return np.polyfit(np.log10(_nBoxes), np.log10(_counts), 1)[0]
+    _nBoxes = __BoxNumbers(lowN, highN, points=points)
+    with stage("hurst.occupancy"):
+        _occupancy = __Occupancy1D(series)
+    with stage("hurst.boxcount"):
+        _counts = np.array([__BoxCount1D(_occupancy, nb, wrap=wrap) for nb in _nBoxes])
+    return __LogLogSlope(_nBoxes, _counts)
+
+def __Occupancy2D(mask):
+    # summed-area table of the (binary) mask
+    _occupancy = np.zeros((mask.shape[0] + 1, mask.shape[1] + 1), dtype=int)
+    _occupancy[1:, 1:] = np.cumsum(np.cumsum(np.asarray(mask) > 0, axis=0), axis=1)
+    return _occupancy
+
+def __BoxCount2D(occupancy, nSegments, /, *, wrap=True):
+    _rows = occupancy.shape[0] - 1
+    _cols = occupancy.shape[1] - 1
+    _rowSize = _rows // nSegments
+    _colSize = _cols // nSegments
+
+    def _occupied(rowOffset, colOffset):
+        _r = rowOffset + _rowSize * np.arange(nSegments + 1)
+        _c = colOffset + _colSize * np.arange(nSegments + 1)
+        _corners = occupancy[np.ix_(_r, _c)]
+        _sums = _corners[1:, 1:] - _corners[:-1, 1:] - _corners[1:, :-1] + _corners[:-1, :-1]
+        return np.sum(_sums > 0)
+
+    _count = _occupied(0, 0)
+    if wrap:
+        # wrap might be needed to account for the edge points too
+        _count = _count + _occupied(_rows - nSegments * _rowSize, _cols - nSegments * _colSize)
+    return _count // 2
+
+def BoxCount2D(mask, lowN, highN, /, *, wrap=True, points=100):
+    # NOTE: mask is two dimensional binary (occupancy) array, nBoxes is the
+    # number of boxes along each side
+    _nBoxes = __BoxNumbers(lowN, highN, points=points)
+    with stage("hurst.occupancy"):
+        _occupancy = __Occupancy2D(mask)
+    with stage("hurst.boxcount"):
+        _counts = np.array([__BoxCount2D(_occupancy, nb, wrap=wrap) for nb in _nBoxes])
+    return __LogLogSlope(_nBoxes, _counts)
+
+def __BoxCountPoints2D(coords, nSegments, /):
+    # coords are already rescaled to [0, 1] interval
+    _boxes = np.minimum((coords * nSegments).astype(int), nSegments - 1)
+    return len(np.unique(_boxes[:, 0] * nSegments + _boxes[:, 1]))
+
+def BoxCountPoints2D(coords, lowN, highN, /, *, points=100):
+    # NOTE: coords is (number of points x 2) array, boxes cover the bounding
+    # box of the point set
+    _nBoxes = __BoxNumbers(lowN, highN, points=points)
+    _coords = np.asarray(coords, dtype=float)
+    _low = np.min(_coords, axis=0)
+    _extent = np.max(_coords, axis=0) - _low
+    # points sharing a coordinate occupy a single box along that axis
+    _extent[_extent == 0] = 1
+    _coords = (_coords - _low) / _extent
+    with stage("hurst.boxcount"):
+        _counts = np.array([__BoxCountPoints2D(_coords, nb) for nb in _nBoxes])
+    return __LogLogSlope(_nBoxes, _counts)
@@ -1,8 +1,195 @@
+from typing import Optional, Sequence, Tuple
+
 import numpy as np
 from scipy.special import factorial  # type: ignore
 
+from .profiling import stage
+from .series_input import iter_chunks, series_range
+
+
+class KramersMoyalAccumulator:
+    """Accumulate Kramers-Moyal moments over a stream of chunks.
+
+    Input:
+        orders:
+            Which order terms to calculate.
+        n_bins:
+            Number of bins to use when estimating Kramers-Moyal terms. Bins
+            are used to aggregate initial conditions into manageable ranges.
+        bins_start:
+            Lower bound of the initial condition range. Values outside the
+            range are not used as initial conditions.
+        bins_end:
+            Upper bound of the initial condition range.
+        lags:
+            Time lags (in number of samples) at which the increments are
+            evaluated.
+        delta_t:
+            Sampling period of the time series.
+
+    Chunks passed to `update` are assumed to follow each other in time.
+    Accumulators filled by parallel workers can be combined using `merge`.
+    """
+
+    def __init__(
+        self,
+        orders: Sequence[int],
+        n_bins: int,
+        bins_start: float,
+        bins_end: float,
+        lags: Sequence[int] = (1,),
+        delta_t: float = 1.0,
+    ):
+        self.orders = tuple(orders)
+        self.n_bins = n_bins
+        self.bins_start = bins_start
+        self.bins_end = bins_end
+        self.lags = tuple(lags)
+        self.delta_t = delta_t
+        self.counts = np.zeros((len(self.lags), n_bins + 1), dtype=int)
+        self.moments = np.zeros((len(self.lags), n_bins + 1, len(self.orders)))
+        # first and last values are kept to account for the increments
+        # crossing chunk boundaries
+        self.max_lag = max(self.lags)
+        self.head = np.zeros(0)
+        self.tail = np.zeros(0)
+
+    def _accumulate(self, data: np.ndarray, boundary: int, only_crossing: bool):
+        # increments x(t+lag)-x(t) with x(t+lag) past the boundary are new
+        # (if only_crossing, x(t) must be before the boundary)
+        binned = (data - self.bins_start) / (self.bins_end - self.bins_start)
+        binned = np.round(binned * self.n_bins).astype(int)
+        for lag_idx, lag in enumerate(self.lags):
+            start = max(boundary - lag, 0)
+            stop = len(data) - lag
+            if only_crossing:
+                stop = min(stop, boundary)
+            if stop <= start:
+                continue
+            initial_bin = binned[start:stop]
+            increments = data[start + lag : stop + lag] - data[start:stop]
+            in_range = (initial_bin >= 0) & (initial_bin <= self.n_bins)
+            initial_bin = initial_bin[in_range]
+            increments = increments[in_range]
+            self.counts[lag_idx] += np.bincount(initial_bin, minlength=self.n_bins + 1)
+            for order_idx, order in enumerate(self.orders):
+                self.moments[lag_idx, :, order_idx] += np.bincount(
+                    initial_bin, weights=increments**order, minlength=self.n_bins + 1
+                )
+
+    def update(self, chunk: np.ndarray) -> "KramersMoyalAccumulator":
+        """Ingest next chunk of the time series."""
+        chunk = np.asarray(chunk, dtype=float)
+        data = chunk
+        if len(self.tail) > 0:
+            data = np.concatenate((self.tail, chunk))
+        with stage("kramers_moyal.moments"):
+            self._accumulate(data, len(self.tail), False)
+        if len(self.head) < self.max_lag:
+            self.head = np.concatenate((self.head, chunk))[: self.max_lag]
+        # copy, so that the chunk itself is not kept alive
+        self.tail = np.array(data[-self.max_lag :])
+        return self
+
+    def merge(
+        self, other: "KramersMoyalAccumulator", contiguous: bool = True
+    ) -> "KramersMoyalAccumulator":
+        """Merge accumulator, which was filled with data following ours.
+
+        If `contiguous` is False, the data of `other` is considered to be
+        unrelated and increments crossing the boundary are not counted.
+        """
+        if (
+            self.orders != other.orders
+            or self.lags != other.lags
+            or self.n_bins != other.n_bins
+            or self.bins_start != other.bins_start
+            or self.bins_end != other.bins_end
+        ):
+            raise ValueError("Accumulators must share orders, lags and bins")
+        self.counts += other.counts
+        self.moments += other.moments
+        if contiguous:
+            data = np.concatenate((self.tail, other.head))
+            self._accumulate(data, len(self.tail), True)
+        if len(self.head) < self.max_lag:
+            self.head = np.concatenate((self.head, other.head))[: self.max_lag]
+        self.tail = np.concatenate((self.tail, other.tail))[-self.max_lag :]
+        return self
+
+    def finalize(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Obtain Kramers-Moyal coefficients.
+
+        Output:
+            Tuple of three numpy arrays. The first one contains initial
+            values (binned). The second one is three dimensional (lags x bins
+            x orders) and contains Kramers-Moyal coefficients. The third one
+            (lags x bins) contains number of samples in each bin.
+        """
+        coeff = np.zeros(self.moments.shape)
+        populated = self.counts > 0
+        coeff[populated] = self.moments[populated] / self.counts[populated, None]
+        norm = factorial(np.array(self.orders)) * self.delta_t
+        coeff = coeff / (np.array(self.lags)[:, None, None] * norm)
+        x_range = self.bins_end - self.bins_start
+        x_0 = x_range * np.arange(0, self.n_bins + 1) / self.n_bins + self.bins_start
+        return x_0, coeff, self.counts.copy()
+
+
+def get_km_table(
+    orders: Sequence[int],
+    n_bins: int,
+    series: np.ndarray,
+    delta_t: float,
+    bins_range: Optional[Tuple[float, float]] = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Calculate Kramers-Moyal terms of several orders in a single pass.
+
+    Input:
+        orders:
+            Which order terms to calculate.
+        n_bins:
+            Number of bins to use when estimating Kramers-Moyal terms. Bins
+            are used to aggregate initial conditions into manageable ranges.
+        series:
+            One dimensional array containing time series values at fixed time
+            intervals.
+        delta_t:
+            Sampling period of the time series given as `series` input
+            variable.
+        bins_range:
+            Range of the initial values (minimum and maximum of the series
+            by default). Required if the series is given as chunk iterator.
+
+    The series can be also given as `np.memmap`, path to .npy file or an
+    iterator over consecutive chunks, such series is processed chunk by
+    chunk.
+
+    Output:
+        Tuple of three numpy arrays. The first one contains initial values
+        (binned). The second one is two dimensional, its columns contain
+        respective values of Kramers-Moyal coefficients of the requested
+        orders. The third one contains number of samples in each bin, it can
+        be used to discard poorly populated bins.
+    """
+    if bins_range is None:
+        bins_range = series_range(series)
+    accumulator = KramersMoyalAccumulator(
+        orders, n_bins, bins_range[0], bins_range[1], delta_t=delta_t
+    )
+    for chunk in iter_chunks(series):
+        accumulator.update(chunk)
+    x_0, coeff, counts = accumulator.finalize()
+    return x_0, coeff[0], counts[0]
+
 
-def get_km(order: int, n_bins: int, series: np.ndarray, delta_t: float) -> np.ndarray:
+def get_km(
+    order: int,
+    n_bins: int,
+    series: np.ndarray,
+    delta_t: float,
+    bins_range: Optional[Tuple[float, float]] = None,
+) -> np.ndarray:
     """Calculate Kramers-Moyal term.
 
     Input:
@@ -17,34 +204,13 @@ def get_km(order: int, n_bins: int, series: np.ndarray, delta_t: float) -> np.nd
         delta_t:
             Sampling period of the time series given as `series` input
             variable.
+        bins_range:
+            Range of the initial values (see `get_km_table`).
 
     Output:
         Two dimensional numpy array. First column contains initial values
         (binned), second column contains respective value of a Kramers-Moyal
         coefficient.
     """
-    bins_start = np.min(series)
-    bins_end = np.max(series)
-
-    binned_series = series.copy()
-    binned_series = (binned_series - bins_start) / (bins_end - bins_start)
-    binned_series = np.round(binned_series * n_bins).astype(int)
-
-    initial_bin = np.arange(0, n_bins + 1).astype(int)
-    coeff = np.zeros(initial_bin.shape)
-    mask_next = np.empty_like(binned_series, dtype=bool)
-    # first value will never be x(t+delta_t) candidate
-    mask_next[0] = False
-    for idx, x in enumerate(initial_bin):
-        # pick out when x(t) falls inside the considered bin
-        mask_initial = binned_series == x
-        # we do not care about last value, because we do not know what follows it
-        mask_initial[-1] = False
-        if np.any(mask_initial):
-            # pick proper x(t+delta_t)
-            mask_next[1:] = mask_initial[:-1]
-            coeff[idx] = np.mean((series[mask_next] - series[mask_initial]) ** order)
-    coeff = coeff / (factorial(order) * delta_t)
-    x_0 = (bins_end - bins_start) * initial_bin / n_bins + bins_start
-
-    return np.vstack((x_0, coeff)).T
+    x_0, coeff, _ = get_km_table([order], n_bins, series, delta_t, bins_range)
+    return np.vstack((x_0, coeff[:, 0])).T
@@ -6,10 +6,22 @@
 ## http://mokslasplius.lt/rizikos-fizika/multifractality-time-series
 ##
 
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
 import numpy as np
-import matplotlib.pyplot as plt
 
-def __fluctuations(profile,q,scale):
+from .cache import cached, content_key, get_cache
+from .panel import map_panel
+from .profiling import stage
+from .rolling import window_log_sums, window_segments, window_sums
+from .series_input import (attach_shared_series, is_chunk_iterator,
+                           is_out_of_core, iter_chunks, iter_profile,
+                           iter_segments, load_series, series_mean,
+                           shared_series)
+
+def __fluctuations(profile,q,scale,order=1):
     # segment profile into equal chunks
     segments=int(len(profile) // scale)
     stridedProfile=np.lib.stride_tricks.as_strided(profile,shape=(segments,scale))
@@ -17,44 +29,265 @@ def __fluctuations(profile,q,scale):
     xVals=np.arange(scale)
     fqs=np.zeros(segments)
     for i, segVals in enumerate(stridedProfile):
-        coef=np.polyfit(xVals,segVals,1)
+        coef=np.polyfit(xVals,segVals,order)
         fitVals=np.polyval(coef,xVals)
         fqs[i]=np.mean((segVals-fitVals)**2)
     return fqs
 
-def MakeDfa(profile,q,scaleSample,showFqs=False):
+def __detrendBasis(scale,order):
+    # orthonormal basis spanning polynomials up to given order; Legendre
+    # polynomials on [-1,1] keep the basis well conditioned for high orders
+    xVals=np.linspace(-1,1,scale)
+    basis,_=np.linalg.qr(np.polynomial.legendre.legvander(xVals,order))
+    return basis
+
+def __segmentFluctuations(segments,basis):
+    # closed-form least squares fit of all chunks at once: residuals are
+    # obtained by removing projection onto the polynomial basis
+    residuals=segments-(segments@basis)@basis.T
+    return np.mean(residuals**2,axis=-1)
+
+def __batchFluctuations(profile,scale,order=1):
+    # segment profile into equal chunks (view, no copy); stacked profiles
+    # of equal length are segmented along the last axis
+    segments=int(profile.shape[-1] // scale)
+    stridedProfile=profile[...,:segments*scale].reshape(
+        profile.shape[:-1]+(segments,scale))
+    return __segmentFluctuations(stridedProfile,__detrendBasis(scale,order))
+
+def __varianceTable(profile,scaleSample,order=1,batch=True):
+    # segment variances do not depend on q, so they are evaluated once
+    # for every scale and reused for the whole q grid; if caching is enabled
+    # they are reused by later calls with the same profile too
+    if(batch):
+        variances=partial(__batchFluctuations,profile,order=order)
+    else:
+        variances=partial(__fluctuations,profile,None,order=order)
+    if(get_cache() is None):
+        return [variances(s) for s in scaleSample]
+    key=content_key(profile)
+    return [cached(partial(variances,s),"mfdfa.variances",key,int(s),order,
+                   batch) for s in scaleSample]
+
+def __momentState(nQ,shape=()):
+    # shape is that of stacked series (empty for a single series)
+    return {"peak": np.full((nQ,)+shape,-np.inf),"sum": np.zeros((nQ,)+shape),
+            "logSum": 0.0,"count": 0}
+
+def __addMoments(state,variances,qSample,blockSize=2**22):
+    # averaging is done in log domain (log-sum-exp) so that large |q| do not
+    # overflow; sums are kept relative to the running peak, so segments can
+    # be added in several portions
+    logVars=0.5*np.log(variances)
+    if(logVars.shape[-1]==0):
+        return
+    state["logSum"]=state["logSum"]+np.sum(logVars,axis=-1)
+    state["count"]=state["count"]+logVars.shape[-1]
+    nonZero=np.flatnonzero(qSample!=0)
+    # limit the size of (q x segments) temporaries
+    step=max(1,blockSize//logVars.size)
+    for i in range(0,len(nonZero),step):
+        idx=nonZero[i:i+step]
+        terms=qSample[idx].reshape((-1,)+(1,)*logVars.ndim)*logVars
+        peak=np.maximum(state["peak"][idx],np.max(terms,axis=-1))
+        state["sum"][idx]=(state["sum"][idx]*np.exp(state["peak"][idx]-peak)
+                           +np.sum(np.exp(terms-peak[...,None]),axis=-1))
+        state["peak"][idx]=peak
+
+def __finishMoments(state,qSample):
+    fqs=np.zeros(state["peak"].shape)
+    fqs[:]=np.exp(state["logSum"]/state["count"])
+    nonZero=np.flatnonzero(qSample!=0)
+    logMean=state["peak"][nonZero]+np.log(state["sum"][nonZero]/state["count"])
+    qShape=(-1,)+(1,)*(fqs.ndim-1)
+    fqs[nonZero]=np.exp(logMean/qSample[nonZero].reshape(qShape))
+    return fqs
+
+def __qMoments(variances,qSample,blockSize=2**22):
+    # evaluate fluctuation function for all q at once
+    state=__momentState(len(qSample),np.shape(variances)[:-1])
+    __addMoments(state,variances,qSample,blockSize=blockSize)
+    return __finishMoments(state,qSample)
+
+def __streamFqs(chunks,qSample,scaleSample,order=1,center=None):
+    # out-of-core variant of MakeFqs: profile is accumulated chunk by chunk,
+    # complete segments of every scale are detrended as soon as they are
+    # available and only the running q-moments are kept
+    bases=[__detrendBasis(s,order) for s in scaleSample]
+    states=[__momentState(len(qSample)) for s in scaleSample]
+    for blocks in iter_segments(iter_profile(chunks,center),scaleSample):
+        for state,basis,segments in zip(states,bases,blocks):
+            with stage("mfdfa.detrend"):
+                variances=__segmentFluctuations(segments,basis)
+            with stage("mfdfa.moments"):
+                __addMoments(state,variances,qSample)
+    return np.column_stack([__finishMoments(st,qSample) for st in states])
+
+def __singularitySpectrum(qSample,hq):
+    # mass exponents and their Legendre transform
+    tauq=qSample*hq-1
+    if(len(qSample)<2):
+        return tauq,np.full(len(qSample),np.nan),np.full(len(qSample),np.nan)
+    alpha=np.gradient(tauq,qSample)
+    falpha=qSample*alpha-tauq
+    return tauq,alpha,falpha
+
+def MakeFqs(profile,qSample,scaleSample,order=1,batch=True):
+    # fluctuation function matrix: rows correspond to q, columns to scales;
+    # for stacked profiles (batch only) matrix is (q x series x scales)
+    qSample=np.asarray(qSample,dtype=float)
+    with stage("mfdfa.detrend"):
+        variances=__varianceTable(profile,scaleSample,order=order,batch=batch)
+    with stage("mfdfa.moments"):
+        return np.stack([__qMoments(v,qSample) for v in variances],axis=-1)
+
+def MakeDfa(profile,q,scaleSample,showFqs=False,order=1,batch=True):
     # sample fluctuations in given points
-    fqs=np.zeros(len(scaleSample))
-    for i, s in enumerate(scaleSample):
-        if(q!=0):
-            fqs[i]=np.mean(__fluctuations(profile,q,s)**(q/2))**(1/q)
-        else:
-            fqs[i]=np.exp(0.5*np.mean(np.log(__fluctuations(profile,q,s))))
+    fqs=MakeFqs(profile,[q],scaleSample,order=order,batch=batch)[0]
     if(showFqs):
+        import matplotlib.pyplot as plt
         plt.plot(scaleSample,fqs,label="q="+str(q))
     return fqs
 
-def MakeMfDfa(series,qSample,scaleSample,showFqs=False):
-    # obtain profile
-    profile=np.cumsum(series-np.mean(series))
-    logScaleSample=np.log10(scaleSample)
-    hq=np.zeros(len(qSample))
+def MakeMfDfaSpectrum(series,qSample,scaleSample,showFqs=False,order=1,
+                      batch=True):
+    qSample=np.asarray(qSample,dtype=float)
+    if(is_out_of_core(series)):
+        # memory-mapped arrays, .npy files and chunk iterators are processed
+        # chunk by chunk; mean of a chunk iterator is not known in advance,
+        # profile is centered on the mean of the first chunk instead (linear
+        # difference is removed by detrending of order 1 or higher)
+        center=None
+        if(not is_chunk_iterator(series)):
+            center=series_mean(series)
+        elif(order<1):
+            raise ValueError("Chunk iterators require detrending order >= 1")
+        fqs=__streamFqs(iter_chunks(series,dtype=float),qSample,scaleSample,
+                        order=order,center=center)
+    else:
+        # obtain profile
+        with stage("mfdfa.profile"):
+            profile=np.cumsum(series-np.mean(series))
+        fqs=MakeFqs(profile,qSample,scaleSample,order=order,batch=batch)
     if(showFqs):
+        import matplotlib.pyplot as plt
         plt.figure()
         plt.loglog()
         plt.xlabel('s')
         plt.ylabel('Fq(s)')
-    for i, q in enumerate(qSample):
-        logFqs=np.log10(MakeDfa(profile,q,scaleSample,showFqs=showFqs))
-        hq[i]=np.polyfit(logScaleSample,logFqs,1)[0]
-    if(showFqs):
+        for q, qFqs in zip(qSample,fqs):
+            plt.plot(scaleSample,qFqs,label="q="+str(q))
         plt.show()
-    return hq
+    # fit all q at once
+    with stage("mfdfa.fit"):
+        hq=np.polyfit(np.log10(scaleSample),np.log10(fqs).T,1)[0]
+        tauq,alpha,falpha=__singularitySpectrum(qSample,hq)
+    return hq,tauq,alpha,falpha,fqs
+
+def MakeMfDfa(series,qSample,scaleSample,showFqs=False,order=1,batch=True):
+    return MakeMfDfaSpectrum(series,qSample,scaleSample,showFqs=showFqs,
+                             order=order,batch=batch)[0]
+
+def __fitHq(fqs,qSample,scaleSample):
+    # fit h(q) of several series at once, fqs is (q x series x scales) array,
+    # returns (series x q) array
+    with stage("mfdfa.fit"):
+        logFqs=np.log10(fqs).reshape(-1,len(scaleSample))
+        hq=np.polyfit(np.log10(scaleSample),logFqs.T,1)[0]
+    return hq.reshape(len(qSample),-1).T
+
+def __panelHq(block,qSample,scaleSample,order):
+    # all series of the block share segmentation, so their profiles are
+    # detrended together and h(q) of all series is fitted at once
+    with stage("mfdfa.profile"):
+        profile=np.cumsum(block-np.mean(block,axis=1,keepdims=True),axis=1)
+    return __fitHq(MakeFqs(profile,qSample,scaleSample,order=order),qSample,
+                   scaleSample)
+
+def MakeMfDfaPanel(panel,qSample,scaleSample,order=1,workers=1,
+                   batchLen=2**22):
+    # panel is (series x time) array or a ragged collection of series,
+    # returns (series x q) array of generalized Hurst exponents; series of
+    # equal length are processed at once, batches are distributed among
+    # worker threads
+    qSample=np.asarray(qSample,dtype=float)
+    task=partial(__panelHq,qSample=qSample,scaleSample=scaleSample,
+                 order=order)
+    return np.array(map_panel(task,panel,workers=workers,batch_len=batchLen))
+
+def RollingMfDfa(series,qSample,scaleSample,window,step=1,order=1):
+    # h(q) in every window series[i*step:i*step+window], returns (windows x q)
+    # array. Segments of every scale are aligned to a single grid over the
+    # whole series, so variance of each segment is evaluated once and shared
+    # by all windows containing it; q-moments of the windows are combined
+    # from block sums (see rolling.py), so cost of a step does not depend on
+    # window length. Window mean is not removed from the profile, linear
+    # difference is removed by detrending of order 1 or higher
+    if(order<1):
+        raise ValueError("Rolling MF-DFA requires detrending order >= 1")
+    qSample=np.asarray(qSample,dtype=float)
+    series=np.asarray(series,dtype=float)
+    with stage("mfdfa.profile"):
+        profile=np.cumsum(series-np.mean(series))
+    nonZero=qSample!=0
+    fqs=[]
+    for scale in scaleSample:
+        first,last=window_segments(len(series),window,step,scale)
+        with stage("mfdfa.detrend"):
+            logVars=0.5*np.log(__batchFluctuations(profile,scale,order=order))
+        with stage("mfdfa.moments"):
+            logCounts=np.log(last-first+1)
+            logMeans=np.zeros((len(qSample),len(first)))
+            logMeans[nonZero]=window_log_sums(
+                np.outer(qSample[nonZero],logVars),first,last)-logCounts
+            # q=0 corresponds to geometric mean
+            logMeans[~nonZero]=window_sums(logVars,first,last)/(last-first+1)
+            fqs.append(np.exp(logMeans/np.where(nonZero,qSample,1)[:,None]))
+    return __fitHq(np.stack(fqs,axis=-1),qSample,scaleSample)
+
+#
+# Segmented MF-DFA: segments are independent, hence they can be processed by
+# a pool of worker processes, which read the series from shared memory (or
+# map the file the series is mapped from)
+#
+__sharedSeries={}
+
+def __attachSeries(name,length,dtype,offset):
+    # executed once in every worker process
+    __sharedSeries['series']=attach_shared_series(name,length,dtype,offset)
+
+def __segmentMfDfa(start,segmentSize,qSample,scaleSample,order):
+    # plain view, segments of memory-mapped series fit into memory
+    segment=np.asarray(__sharedSeries['series'][start:start+segmentSize])
+    return MakeMfDfa(segment,qSample,scaleSample,order=order)
 
-def MakeSegMfDfa(series,qSample,scaleSample,segmentSize=None):
+def MakeSegMfDfa(series,qSample,scaleSample,segmentSize=None,order=1,
+                 workers=1):
     if(segmentSize is None):
-        return MakeMfDfa(series,qSample,scaleSample)
-    hqs=()
-    for i in np.arange(0,len(series)-segmentSize+1,segmentSize):
-        hqs=hqs+(MakeMfDfa(series[i:i+segmentSize],qSample,scaleSample),)
-    return np.mean(np.vstack(hqs),axis=0)
+        return MakeMfDfa(series,qSample,scaleSample,order=order)
+    series=load_series(series)
+    starts=np.arange(0,len(series)-segmentSize+1,segmentSize)
+    hqs=np.zeros((len(starts),len(qSample)))
+    if(workers is None):
+        workers=os.cpu_count()
+    if(workers==1):
+        for i, start in enumerate(starts):
+            # plain view, segments of memory-mapped series fit into memory
+            segment=np.asarray(series[start:start+segmentSize])
+            hqs[i]=MakeMfDfa(segment,qSample,scaleSample,order=order)
+        return np.mean(hqs,axis=0)
+    # stages executed by the workers are not recorded, the pool is timed
+    # as a whole
+    # share series (in memory or by its file) instead of pickling it for
+    # every worker
+    task=partial(__segmentMfDfa,segmentSize=segmentSize,qSample=qSample,
+                 scaleSample=scaleSample,order=order)
+    chunkSize=max(1,len(starts)//(4*workers))
+    with shared_series(series) as handle, stage("mfdfa.pool"), \
+            ProcessPoolExecutor(max_workers=workers,initializer=__attachSeries,
+                                initargs=handle) as pool:
+        # results arrive in submission order, so the output does not
+        # depend on the number of workers
+        for i, hq in enumerate(pool.map(task,starts,chunksize=chunkSize)):
+            hqs[i]=hq
+    return np.mean(hqs,axis=0)
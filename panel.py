@@ -0,0 +1,88 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def __panel_series(panel: Any) -> Sequence[np.ndarray]:
+    # Rows of two dimensional arrays are views, ragged collections are
+    # converted series by series (no copy if already float arrays).
+    if isinstance(panel, np.ndarray) and panel.ndim == 2:
+        return panel
+    return [np.asarray(series, dtype=float) for series in panel]
+
+
+def __panel_blocks(
+    series: Sequence[np.ndarray], batch_len: int, workers: int
+) -> List[np.ndarray]:
+    # Indices of the series grouped by length and split into batches of at
+    # most `batch_len` values (at least one series per batch). Groups are
+    # split among all workers even if they would fit into a single batch.
+    groups: Dict[int, List[int]] = {}
+    for idx, values in enumerate(series):
+        groups.setdefault(len(values), []).append(idx)
+    batches = []
+    for length, indices in groups.items():
+        batch_size = max(batch_len // max(length, 1), 1)
+        batch_size = min(batch_size, -(-len(indices) // workers))
+        for start in range(0, len(indices), batch_size):
+            batches.append(np.array(indices[start : start + batch_size]))
+    return batches
+
+
+def map_panel(
+    func: Callable[[np.ndarray], Sequence[Any]],
+    panel: Any,
+    workers: Optional[int] = 1,
+    batch_len: int = 2**22,
+) -> List[Any]:
+    """Apply batch estimator to every series of a panel.
+
+    Input:
+        func:
+            Estimator, which takes two dimensional ndarray (series x time)
+            and returns a sequence with one result per row.
+        panel:
+            Two dimensional array (series x time) or a ragged collection of
+            one dimensional series.
+        workers:
+            Number of threads among which the batches are distributed
+            (`None` - number of CPUs).
+        batch_len:
+            Maximum number of values passed to a single `func` call. Series
+            of equal length are stacked into batches, hence the estimator is
+            vectorized along the series axis, while memory use is bounded.
+
+    Output:
+        List with the result for every series (in the order of the panel).
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    series = __panel_series(panel)
+    batches = __panel_blocks(series, batch_len, workers)
+    if isinstance(series, np.ndarray):
+
+        def _block(indices: np.ndarray) -> np.ndarray:
+            # rows of the same batch are consecutive
+            return np.asarray(series[indices[0] : indices[-1] + 1], dtype=float)
+
+    else:
+
+        def _block(indices: np.ndarray) -> np.ndarray:
+            return np.stack([series[idx] for idx in indices])
+
+    def _evaluate(indices: np.ndarray) -> Sequence[Any]:
+        return func(_block(indices))
+
+    if workers > 1 and len(batches) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            outputs = list(pool.map(_evaluate, batches))
+    else:
+        outputs = [_evaluate(indices) for indices in batches]
+
+    results: List[Any] = [None] * len(series)
+    for indices, output in zip(batches, outputs):
+        for idx, result in zip(indices, output):
+            results[idx] = result
+    return results
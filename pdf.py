@@ -2,10 +2,13 @@ from typing import Optional
 
 import numpy as np
 
+from .histogram import HistogramAccumulator
+from .series_input import fill_range, iter_chunks
+
 
 def __make_pdf(
-    data: list,
-    bin_boundaries: list,
+    histogram: np.ndarray,
+    bin_boundaries: np.ndarray,
 ) -> np.ndarray:
     # We usually study distributions, which have single region of support.
     # In other words, most distributions we study should have non-zero
@@ -14,7 +17,6 @@ def __make_pdf(
     # For this reason we set bins manually, calculate histogram with
     # density=False setting, delete empty bins, and finally calculate the
     # density manually by dividing counts by the width of non-empty bins.
-    histogram = np.histogram(data, bins=bin_boundaries, density=False)[0]
     empty_bin_pos = np.where(histogram == 0)
     # For simplicity sake, the bin to the left of non-empty bin is extended.
     histogram = np.delete(histogram, empty_bin_pos)
@@ -35,15 +37,16 @@ def make_pdf(
     stop: Optional[float] = None,
     out_points: int = 100,
 ) -> np.ndarray:
-    """Extract empirical PDF on lin-lin scale."""
-    if start is None:
-        start = np.min(data)
-    if stop is None:
-        stop = np.max(data)
+    """Extract empirical PDF on lin-lin scale.
 
-    bin_boundaries = np.linspace(start, stop, num=out_points)
+    Data may be given in any form accepted by `right_histogram`.
+    """
+    start, stop = fill_range(data, start, stop)
 
-    return __make_pdf(data, bin_boundaries)
+    accumulator = HistogramAccumulator(start, stop, out_points=out_points, right=False)
+    for chunk in iter_chunks(data):
+        accumulator.update(chunk)
+    return pdf_from_histogram(accumulator)
 
 
 def make_log_pdf(
@@ -52,21 +55,25 @@ def make_log_pdf(
     stop: Optional[float] = None,
     out_points: int = 100,
 ) -> np.ndarray:
-    """Extract empirical PDF on log-log scale."""
-    if start is None:
-        _start = np.min(data)
-    else:
-        _start = start
-    _start = np.log10(_start)
-    if stop is None:
-        _stop = np.max(data)
-    else:
-        _stop = stop
-    _stop = np.log10(_stop)
-
-    bin_boundaries = np.logspace(_start, _stop, num=out_points)
-
-    return __make_pdf(data, bin_boundaries)
+    """Extract empirical PDF on log-log scale.
+
+    Data may be given in any form accepted by `right_histogram`.
+    """
+    start, stop = fill_range(data, start, stop)
+
+    accumulator = HistogramAccumulator(
+        start, stop, out_points=out_points, log=True, right=False
+    )
+    for chunk in iter_chunks(data):
+        accumulator.update(chunk)
+    return pdf_from_histogram(accumulator)
+
+
+def pdf_from_histogram(accumulator: HistogramAccumulator) -> np.ndarray:
+    """Extract empirical PDF from left-inclusive histogram accumulator."""
+    if accumulator.right:
+        raise ValueError("PDF requires left-inclusive histogram")
+    return __make_pdf(accumulator.counts, accumulator.edges)
 
 
 def estimate_cdf_from_pdf(pdf: list) -> np.ndarray:
@@ -1,27 +1,121 @@
-from collections import Counter
-from typing import Optional
+from typing import Optional, Tuple
 
 import numpy as np
 
+from .profiling import stage
+from .series_input import iter_chunks
+
+
+class PmfAccumulator:
+    """Accumulate (weighted) counts of distinct values over a stream of chunks.
+
+    Input:
+        start:
+            Values below `start` are ignored. (optional)
+        stop:
+            Values above `stop` are ignored. (optional)
+
+    Accumulators can be combined using `merge`.
+    """
+
+    def __init__(self, start: Optional[float] = None, stop: Optional[float] = None):
+        self.start = start
+        self.stop = stop
+        self.values = np.zeros(0)
+        self.counts = np.zeros(0, dtype=int)
+
+    def _count(
+        self, data: np.ndarray, weights: Optional[np.ndarray]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        if len(data) == 0:
+            return data, np.zeros(0, dtype=int)
+        if np.issubdtype(data.dtype, np.integer) and data.dtype != np.uint64:
+            # widen, so that offsets of small integer types do not overflow
+            # (uint64 does not fit into int64, it is counted as sparse data)
+            data = data.astype(np.int64, copy=False)
+            low = np.min(data)
+            span = int(np.max(data)) - int(low) + 1
+            if span <= 4 * len(data):
+                # dense integer data: count by offset index
+                offsets = data - low
+                present = np.bincount(offsets, minlength=span)
+                counts = present
+                if weights is not None:
+                    counts = np.bincount(offsets, weights=weights, minlength=span)
+                values = np.flatnonzero(present)
+                return values + low, counts[values]
+        # sparse integer data or other data: count sorted unique values
+        values, inverse, counts = np.unique(
+            data, return_inverse=True, return_counts=True
+        )
+        if weights is not None:
+            counts = np.bincount(inverse.ravel(), weights=weights)
+        return values, counts
+
+    def _add(self, values: np.ndarray, counts: np.ndarray):
+        if len(self.values) == 0:
+            self.values, self.counts = values, counts
+            return
+        values = np.concatenate((self.values, values))
+        counts = np.concatenate((self.counts, counts))
+        order = np.argsort(values, kind="stable")
+        values = values[order]
+        counts = counts[order]
+        first = np.flatnonzero(np.concatenate(([True], values[1:] != values[:-1])))
+        self.values = values[first]
+        self.counts = np.add.reduceat(counts, first)
+
+    def update(
+        self, data: np.ndarray, weights: Optional[np.ndarray] = None
+    ) -> "PmfAccumulator":
+        """Count values from the next chunk of data."""
+        with stage("pmf.count"):
+            _data = np.asarray(data)
+            mask = np.ones(len(_data), dtype=bool)
+            if self.start is not None:
+                mask &= self.start <= _data
+            if self.stop is not None:
+                mask &= _data <= self.stop
+            if not np.all(mask):
+                _data = _data[mask]
+                if weights is not None:
+                    weights = np.asarray(weights)[mask]
+            self._add(*self._count(_data, weights))
+        return self
+
+    def merge(self, other: "PmfAccumulator") -> "PmfAccumulator":
+        """Add counts accumulated by other accumulator."""
+        self._add(other.values, other.counts)
+        return self
+
+    def pmf(self) -> np.ndarray:
+        """Obtain sorted (value, probability) array."""
+        pmf = np.array([self.values, self.counts], dtype=float).T
+        pmf[:, 1] = pmf[:, 1] / np.sum(self.counts)
+        return pmf
+
 
 def make_pmf(
     data: list,
     start: Optional[float] = None,
     stop: Optional[float] = None,
+    weights: Optional[list] = None,
 ) -> np.ndarray:
-    """Extract empirical probability mass function from data."""
-    _data = np.array(data)
-
-    if start is None:
-        start = np.min(data)
-    if stop is None:
-        stop = np.max(data)
-    _data = _data[(start <= _data) & (_data <= stop)]
-
-    counter_dict = Counter(_data)
-    pmf = np.array(
-        [list(counter_dict.keys()), list(counter_dict.values())], dtype=float
-    ).T
-    pmf = pmf[np.argsort(pmf[:, 0])]
-    pmf[:, 1] = pmf[:, 1] / len(_data)
-    return pmf
+    """Extract empirical probability mass function from data.
+
+    Integer data is counted using `numpy.bincount` if its range is dense,
+    otherwise (and for non-integer data) sorted unique values are counted.
+    Optional `weights` are used instead of unit counts.
+
+    Data (and weights) can be also given as `np.memmap`, path to .npy file
+    or an iterator over chunks, such data is processed chunk by chunk.
+    Chunks of data and weights iterators must be of equal lengths.
+    """
+    accumulator = PmfAccumulator(start=start, stop=stop)
+    if weights is None:
+        for chunk in iter_chunks(data):
+            accumulator.update(chunk)
+    else:
+        for chunk, chunk_weights in zip(iter_chunks(data), iter_chunks(weights)):
+            accumulator.update(chunk, weights=chunk_weights)
+    return accumulator.pmf()
@@ -0,0 +1,214 @@
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional
+
+# Callback receives stage name, wall time (in seconds), net number of
+# allocated bytes and peak number of bytes allocated during the stage (both
+# are None unless memory is profiled, see `profile`).
+StageCallback = Callable[[str, float, Optional[int], Optional[int]], None]
+
+
+class Profiler:
+    """Aggregate statistics of the named stages.
+
+    For every stage number of calls and total wall time is kept. If memory
+    is profiled, net number of allocated bytes (summed over calls) and peak
+    number of bytes allocated above the level at the start of the stage
+    (maximum over calls, where it was measured) are kept too. Stages may be
+    nested, time of the outer stage includes time of the inner ones. Memory
+    figures are process wide, hence they are only approximate if several
+    threads run stages.
+    """
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        name: str,
+        elapsed: float,
+        allocated: Optional[int] = None,
+        peak: Optional[int] = None,
+    ) -> None:
+        """Add single call of the stage."""
+        with self._lock:
+            stats = self.stages.setdefault(name, {"calls": 0, "time": 0.0})
+            stats["calls"] += 1
+            stats["time"] += elapsed
+            if allocated is not None:
+                stats["allocated"] = stats.get("allocated", 0) + allocated
+            if peak is not None:
+                stats["peak"] = max(stats.get("peak", 0), peak)
+
+    def as_dict(self) -> Dict[str, Dict[str, Any]]:
+        """Obtain statistics as {stage: {"calls", "time"[, "allocated", "peak"]}}."""
+        with self._lock:
+            return {name: dict(stats) for name, stats in self.stages.items()}
+
+    def to_json(self, **kwargs: Any) -> str:
+        """Obtain statistics as JSON (`kwargs` are passed to `json.dumps`)."""
+        return json.dumps(self.as_dict(), **kwargs)
+
+    def reset(self) -> None:
+        """Drop collected statistics."""
+        with self._lock:
+            self.stages.clear()
+
+
+__profilers: List[Profiler] = []
+__callbacks: List[StageCallback] = []
+# Memory is traced only while a profiler requests it. Peak is reset at the
+# start of every stage only if tracemalloc was started by `profile`, so
+# that peak measured by other users of tracemalloc is left intact.
+__memory = {"profilers": 0, "reset_peak": False}
+__local = threading.local()
+__null_stage = nullcontext()
+
+
+def __stack() -> list:
+    # stack of stages open in the current thread
+    if not hasattr(__local, "stack"):
+        __local.stack = []
+    return __local.stack
+
+
+def __emit(
+    name: str, elapsed: float, allocated: Optional[int], peak: Optional[int]
+) -> None:
+    for profiler in list(__profilers):
+        profiler.record(name, elapsed, allocated, peak)
+    for callback in list(__callbacks):
+        callback(name, elapsed, allocated, peak)
+
+
+class _Stage:
+    # Timed stage. If peak may be reset, it is tracked with
+    # `tracemalloc.reset_peak` and peak reached so far is handed to the
+    # enclosing stages before it is reset. Otherwise peak of the stage is
+    # known only if it exceeds the peak reached before the stage.
+
+    __slots__ = (
+        "name",
+        "emit",
+        "stack",
+        "memory",
+        "reset_peak",
+        "start",
+        "memory_start",
+        "peak",
+    )
+
+    def __init__(
+        self, name: str, emit: Callable, stack: list, memory: bool, reset_peak: bool
+    ):
+        self.name = name
+        self.emit = emit
+        self.stack = stack
+        self.memory = memory
+        self.reset_peak = reset_peak
+
+    def __enter__(self) -> "_Stage":
+        self.memory_start = None
+        if self.memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            self.memory_start = current
+            self.peak = peak
+            if self.reset_peak:
+                for outer in self.stack:
+                    if outer.memory_start is not None and outer.reset_peak:
+                        outer.peak = max(outer.peak, peak)
+                tracemalloc.reset_peak()
+                self.peak = current
+        self.stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        elapsed = time.perf_counter() - self.start
+        self.stack.pop()
+        allocated = peak = None
+        if self.memory_start is not None and tracemalloc.is_tracing():
+            current, traced_peak = tracemalloc.get_traced_memory()
+            allocated = current - self.memory_start
+            if self.reset_peak:
+                peak = max(self.peak, traced_peak) - self.memory_start
+            elif traced_peak > self.peak:
+                peak = traced_peak - self.memory_start
+        self.emit(self.name, elapsed, allocated, peak)
+
+
+def stage(name: str) -> ContextManager:
+    """Mark a named stage of computation.
+
+    If neither a profiler nor a callback is active, a shared no-op context
+    manager is returned, so instrumentation costs a single function call.
+    """
+    if not __profilers and not __callbacks:
+        return __null_stage
+    return _Stage(
+        name,
+        __emit,
+        __stack(),
+        __memory["profilers"] > 0,
+        __memory["reset_peak"],
+    )
+
+
+def is_enabled() -> bool:
+    """Check whether stages are being recorded."""
+    return bool(__profilers or __callbacks)
+
+
+def add_callback(callback: StageCallback) -> None:
+    """Register function called at the end of every stage."""
+    __callbacks.append(callback)
+
+
+def remove_callback(callback: StageCallback) -> None:
+    """Unregister function added by `add_callback`."""
+    __callbacks.remove(callback)
+
+
+@contextmanager
+def profile(memory: bool = False) -> Iterator[Profiler]:
+    """Record stages of the estimators called within the context.
+
+    Input:
+        memory:
+            Whether to trace memory allocations (`tracemalloc` is started
+            if it is not tracing yet). Tracing slows computations down
+            considerably, so timings obtained with it are inflated. If
+            tracemalloc was started by the caller, its peak is not reset,
+            hence peak of a stage is recorded only if the stage exceeds
+            the peak reached before it.
+
+    Output:
+        `Profiler` collecting the statistics, e.g.
+
+            with profile() as profiler:
+                make_seg_log_psd(series)
+            print(profiler.to_json(indent=2))
+
+    Stages executed by worker processes are not recorded.
+    """
+    profiler = Profiler()
+    started = memory and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+        __memory["reset_peak"] = True
+    if memory:
+        __memory["profilers"] += 1
+    __profilers.append(profiler)
+    try:
+        yield profiler
+    finally:
+        __profilers.remove(profiler)
+        if memory:
+            __memory["profilers"] -= 1
+        if started:
+            __memory["reset_peak"] = False
+            tracemalloc.stop()
@@ -1,9 +1,149 @@
-from typing import Optional, Tuple
+from functools import lru_cache, partial
+from typing import List, Optional, Tuple, Union
 
 import numpy as np
+import scipy.fft as sp_fft  # type: ignore
 import scipy.signal as sp  # type: ignore
 
 from .average_over_loglog import average_over_loglog
+from .cache import cached
+from .panel import map_panel
+from .profiling import stage
+from .series_input import is_chunk_iterator, iter_chunks, iter_segments, load_series
+
+
+def __lagrange_weights(
+    positions: np.ndarray, n_nodes: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    # Nearest `n_nodes` integer nodes around each position and the
+    # corresponding Lagrange interpolation weights.
+    offsets = np.arange(n_nodes)
+    nodes = np.floor(positions).astype(np.int64)[:, None] + (
+        offsets - (n_nodes - 1) // 2
+    )
+    dist = positions[:, None] - nodes
+    # products over all nodes but one from prefix and suffix products
+    left = np.ones_like(dist)
+    right = np.ones_like(dist)
+    left[:, 1:] = np.cumprod(dist[:, :-1], axis=1)
+    right[:, :-1] = np.cumprod(dist[:, :0:-1], axis=1)[:, ::-1]
+    denominators = np.array(
+        [np.prod([m - n for n in offsets if n != m]) for m in offsets], dtype=float
+    )
+    return nodes, left * right / denominators
+
+
+def __grid_trig_sums(
+    times: np.ndarray,
+    weights: np.ndarray,
+    f_center: float,
+    df: float,
+    n_freqs: int,
+    accuracy: int,
+) -> np.ndarray:
+    # Approximate sum(weights * exp(2j*pi*f*times)) for the regular grid of
+    # frequencies f = f_center + k*df, k = -n_freqs//2 .. n_freqs//2 - 1,
+    # with the type 1 NUFFT: observations are spread onto a twice oversampled
+    # regular grid with a Gaussian kernel of half-width `accuracy` nodes, the
+    # grid is transformed by FFT and the kernel is deconvolved (Greengard &
+    # Lee, SIAM Review 46, 443, 2004).
+    grid_len = __to_pow_2(2 * n_freqs)
+    ratio = grid_len / n_freqs
+    tau = np.pi * accuracy / (n_freqs**2 * ratio * (ratio - 0.5))
+    scale = (2 * np.pi / grid_len) ** 2 / (4 * tau)
+    offsets = np.arange(1 - accuracy, accuracy + 1)
+    # nodes are shifted by `accuracy` - 1 to keep indices non-negative, the
+    # padding is wrapped around afterwards
+    padded_len = grid_len + 2 * accuracy - 1
+    grid_re = np.zeros(padded_len)
+    grid_im = np.zeros(padded_len)
+    chunk = 2**18
+    for start in range(0, len(times), chunk):
+        chunk_times = times[start : start + chunk]
+        chunk_weights = weights[start : start + chunk]
+        positions = (df * grid_len * chunk_times) % grid_len
+        nodes = np.floor(positions)
+        kernel = np.exp(-scale * ((positions - nodes)[:, None] - offsets) ** 2)
+        ids = (nodes.astype(np.int64)[:, None] + (offsets + accuracy - 1)).ravel()
+        shift = 2 * np.pi * f_center * chunk_times
+        grid_re += np.bincount(
+            ids, (kernel * (chunk_weights * np.cos(shift))[:, None]).ravel(), padded_len
+        )
+        grid_im += np.bincount(
+            ids, (kernel * (chunk_weights * np.sin(shift))[:, None]).ravel(), padded_len
+        )
+    padded = grid_re + 1j * grid_im
+    grid = padded[accuracy - 1 : accuracy - 1 + grid_len]
+    grid[:accuracy] += padded[grid_len + accuracy - 1 :]
+    grid[grid_len - accuracy + 1 :] += padded[: accuracy - 1]
+    k = np.arange(n_freqs) - n_freqs // 2
+    sums = sp_fft.ifft(grid)[k]
+    return sums * np.sqrt(np.pi / tau) * np.exp(k**2 * tau)
+
+
+def __trig_sums(
+    times: np.ndarray,
+    weights: np.ndarray,
+    freqs: np.ndarray,
+    df: float,
+    accuracy: int,
+    band_len: int = 2**22,
+) -> np.ndarray:
+    # Approximate sum(weights * exp(2j*pi*f*times)) for sorted frequencies.
+    # Sums are smooth functions of f, so they are evaluated on a regular grid
+    # of spacing df and interpolated. Only the parts of the grid around the
+    # requested frequencies are evaluated, in bands of at most `band_len`
+    # grid frequencies to bound memory use.
+    n_nodes = 2 * accuracy
+    f_start = df * (np.floor(freqs[0] / df) - n_nodes)
+    nodes, coefs = __lagrange_weights((freqs - f_start) / df, n_nodes)
+    needed, inverse = np.unique(nodes, return_inverse=True)
+    sums = np.zeros(len(needed), dtype=complex)
+    band_start = 0
+    while band_start < len(needed):
+        first = needed[band_start]
+        band_end = np.searchsorted(needed, first + band_len)
+        ids = needed[band_start:band_end] - first
+        n_freqs = ids[-1] + 1
+        f_center = f_start + (first + n_freqs // 2) * df
+        sums[band_start:band_end] = __grid_trig_sums(
+            times, weights, f_center, df, n_freqs, accuracy
+        )[ids]
+        band_start = band_end
+    return np.sum(coefs * sums[inverse.reshape(nodes.shape)], axis=1)
+
+
+def __fast_lombscargle(
+    times: np.ndarray,
+    vals: np.ndarray,
+    freqs: np.ndarray,
+    oversampling: float,
+    accuracy: int,
+) -> np.ndarray:
+    # Lomb-Scargle periodogram from the trigonometric sums at w (data) and
+    # 2w (time offset tau). Times are centered to slow down oscillation of
+    # the sums along the frequency grid.
+    times = times - 0.5 * (times[0] + times[-1])
+    n_obs = len(times)
+    df = 1.0 / (oversampling * (times[-1] - times[0]))
+    sums_h = __trig_sums(times, vals, freqs, df, accuracy)
+    sums_2 = __trig_sums(times, np.ones(n_obs), 2 * freqs, df, accuracy)
+    cos_h, sin_h = sums_h.real, sums_h.imag
+    cos_2, sin_2 = sums_2.real, sums_2.imag
+    # tan(2 w tau) = sin_2 / cos_2, half-angle formulas give cos and sin
+    # of w tau without evaluating the arctangent
+    hypot_2 = np.hypot(cos_2, sin_2)
+    cos_2tau = np.divide(cos_2, hypot_2, out=np.ones_like(cos_2), where=hypot_2 > 0)
+    cos_tau = np.sqrt(np.clip(0.5 * (1 + cos_2tau), 0, 1))
+    sin_tau = np.copysign(np.sqrt(np.clip(0.5 * (1 - cos_2tau), 0, 1)), sin_2)
+    yc = cos_h * cos_tau + sin_h * sin_tau
+    ys = sin_h * cos_tau - cos_h * sin_tau
+    cc = np.clip(0.5 * (n_obs + hypot_2), 0, n_obs)
+    ss = n_obs - cc
+    return 0.5 * (
+        np.divide(yc**2, cc, out=np.zeros_like(cc), where=cc > 0)
+        + np.divide(ys**2, ss, out=np.zeros_like(ss), where=ss > 0)
+    )
 
 
 def make_equilog_psd(
@@ -12,6 +152,10 @@ def make_equilog_psd(
     min_log_freq: Optional[float] = None,
     max_log_freq: Optional[float] = None,
     out_points: int = 100,
+    method: str = "exact",
+    oversampling: float = 4.0,
+    accuracy: int = 6,
+    exact_limit: int = 2**20,
 ) -> np.ndarray:
     """Calculate equi-log-sampled PSD from non-equi-sampled data.
 
@@ -28,6 +172,23 @@ def make_equilog_psd(
             actual frequency.
         out_points:
             Desired number of points in the output PSD.
+        method:
+            "exact" evaluates Lomb-Scargle periodogram directly
+            (cost is proportional to len(times) * out_points).
+            "fast" uses non-uniform FFT and interpolation
+            (cost is nearly independent of out_points).
+        oversampling:
+            Frequency grid oversampling of the fast method. The
+            periodogram is evaluated on a regular grid with
+            spacing 1 / (oversampling * time span) and then
+            interpolated onto the log-spaced frequencies.
+        accuracy:
+            Half-width (in grid nodes) of the spreading kernel of
+            the fast method. Error decreases roughly tenfold with
+            each increment, cost grows linearly.
+        exact_limit:
+            The fast method falls back to the exact one if
+            len(times) * out_points does not exceed this value.
 
     Output:
         Two dimensional ndarray. Firt column - frequencies,
@@ -39,10 +200,61 @@ def make_equilog_psd(
         min_log_freq = -np.log10(times[-1] - times[0])
     freqs = np.logspace(min_log_freq, max_log_freq, out_points)
     norm = len(times) / 4
-    psd = sp.lombscargle(times, vals, 2 * np.pi * freqs) / norm
+    if method == "fast" and len(times) * out_points > exact_limit:
+        times = np.asarray(times, dtype=float)
+        vals = np.asarray(vals, dtype=float)
+        with stage("psd.lombscargle"):
+            psd = __fast_lombscargle(times, vals, freqs, oversampling, accuracy)
+        psd = psd / norm
+    elif method in ("exact", "fast"):
+        with stage("psd.lombscargle"):
+            psd = sp.lombscargle(times, vals, 2 * np.pi * freqs) / norm
+    else:
+        raise ValueError(f"Unknown method: {method}")
     return np.vstack([freqs, psd]).T
 
 
+def __to_pow_2(num: int) -> int:
+    # (num & (num - 1)) != 0 check if num is already power of 2
+    if num > 0 and (num & (num - 1)) != 0:
+        num = int(2 ** np.ceil(np.log2(num)))
+    return num
+
+
+@lru_cache(maxsize=64)
+def __log_bin_ids(n_freqs: int, out_points: int) -> np.ndarray:
+    # Bin boundaries depend only on the periodogram length and the number of
+    # output points, so they are shared by all segments of the same length.
+    ids = np.unique(np.logspace(0, np.log10(n_freqs), out_points).astype(int)) - 1
+    ids = ids[1:]
+    ids.setflags(write=False)
+    return ids
+
+
+def __log_bin_power(
+    freqs: np.ndarray, power: np.ndarray, out_points: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    # Average periodogram over log-spaced bins [ids[k], ids[k+1]), power of
+    # several series may be stacked along the leading axes.
+    with stage("psd.log_bin"):
+        ids = __log_bin_ids(len(freqs), out_points)
+        if len(ids) < 2:
+            return np.zeros(0), np.zeros(power.shape[:-1] + (0,))
+        bin_freqs = (freqs[ids[:-1]] + freqs[ids[1:]]) / 2
+        bin_power = np.add.reduceat(power, ids, axis=-1)[..., :-1] / np.diff(ids)
+    return bin_freqs, bin_power
+
+
+def __log_bin(psd: np.ndarray, out_points: int) -> np.ndarray:
+    freqs, power = __log_bin_power(psd[:, 0], psd[:, 1], out_points)
+    return np.vstack((freqs, power)).T
+
+
+def __periodogram(series: list, fs: float) -> np.ndarray:
+    with stage("psd.fft"):
+        return np.array(sp.periodogram(series, fs=fs)).T
+
+
 def make_log_psd(series: list, fs: float = 1.0, out_points: int = 100) -> np.ndarray:
     """Estimate log-sampled PSD from equi-sampled data.
 
@@ -60,12 +272,57 @@ def make_log_psd(series: list, fs: float = 1.0, out_points: int = 100) -> np.nda
         Two dimensional ndarray. Firt column - frequencies,
         the second column - estimated PSD at those frequencies.
     """
-    psd = np.array(sp.periodogram(series, fs=fs)).T
-    ids = np.unique(np.logspace(0, np.log10(psd.shape[0]), out_points).astype(int)) - 1
-    ids = np.vstack((ids[1:-1], ids[2:])).T
-    return np.array(
-        [[(psd[i[0], 0] + psd[i[1], 0]) / 2, np.mean(psd[i[0] : i[1], 1])] for i in ids]
+    # periodogram does not depend on out_points, it is cached (if caching
+    # is enabled) for the later calls with the same series
+    psd = cached(
+        partial(__periodogram, series, fs), "psd.periodogram", np.asarray(series), fs
     )
+    return __log_bin(psd, out_points)
+
+
+def make_log_psd_panel(
+    panel: list,
+    fs: float = 1.0,
+    out_points: int = 100,
+    workers: Optional[int] = 1,
+    batch_len: int = 2**22,
+) -> Union[np.ndarray, List[np.ndarray]]:
+    """Estimate log-sampled PSD of every series in a panel.
+
+    Input:
+        panel:
+            Two dimensional array (series x time) or a ragged
+            collection of equi-sampled series. Periodograms of
+            series of equal length are obtained by a single
+            batched FFT.
+        fs:
+            Sampling frequency of the data.
+        out_points:
+            Desired number of points in the output PSD.
+        workers:
+            Number of threads among which the batches of
+            series are distributed.
+        batch_len:
+            Maximum number of values transformed at once.
+
+    Output:
+        Three dimensional ndarray (series x points x 2) with
+        the output of `make_log_psd` for every series. If the
+        outputs differ in shape (e.g., due to different series
+        length), list of two dimensional ndarrays is returned.
+    """
+
+    def _batch_psd(block: np.ndarray) -> np.ndarray:
+        with stage("psd.fft"):
+            freqs, power = sp.periodogram(block, fs=fs, axis=-1)
+        freqs, power = __log_bin_power(freqs, power, out_points)
+        freqs = np.broadcast_to(freqs, power.shape)
+        return np.stack((freqs, power), axis=-1)
+
+    psds = map_panel(_batch_psd, panel, workers=workers, batch_len=batch_len)
+    if len(set(psd.shape for psd in psds)) == 1:
+        return np.stack(psds)
+    return psds
 
 
 def make_seg_log_psd(
@@ -79,7 +336,9 @@ def make_seg_log_psd(
 
     Input:
         series:
-            Equi-sampled data.
+            Equi-sampled data. It can be also given as
+            `np.memmap`, path to .npy file or an iterator
+            over chunks, such data is read segment by segment.
         fs:
             Sampling frequency of the data.
         out_points:
@@ -97,26 +356,32 @@ def make_seg_log_psd(
             data is not perfect, it might be wise to obtain
             segments starting both from the start and from
             the end of the series. Value of this parameter
-            will be ignored, if the split is perfect.
+            will be ignored, if the split is perfect or if
+            the data is given as an iterator over chunks.
 
     Output:
         Two dimensional ndarray. Firt column - frequencies,
         the second column - estimated PSD at those frequencies.
     """
+    psds: Tuple = ()
+    segment_len = __to_pow_2(segment_len)
+    if is_chunk_iterator(series):
+        # length is not known in advance: segments are taken from the start
+        for (segments,) in iter_segments(iter_chunks(series), [segment_len]):
+            for segment in segments:
+                psd = make_log_psd(segment, fs=fs, out_points=10 * out_points)
+                psds = psds + (psd,)
+        if len(psds) == 0:
+            raise ValueError("Series is shorter than a single segment")
+        return average_over_loglog(psds, out_points=out_points)
 
-    def _to_pow_2(num: int) -> int:
-        # (num & (num - 1)) != 0 check if num is already power of 2
-        if num > 0 and (num & (num - 1)) != 0:
-            num = 2 ** np.ceil(np.log2(num))
-        return num
-
+    # memory-mapped series are read segment by segment
+    series = load_series(series)
     series_len = len(series)
-    segment_len = _to_pow_2(segment_len)
     if series_len < segment_len:
-        segment_len = int(_to_pow_2(series_len) / 2)
+        segment_len = int(__to_pow_2(series_len) / 2)
     n_splits = int(np.floor(series_len / segment_len))
 
-    psds: Tuple = ()
     # do spliting from the start of the series
     for i in range(n_splits):
         start = i * segment_len
@@ -135,3 +400,71 @@ def make_seg_log_psd(
             psds = psds + (psd,)
 
     return average_over_loglog(psds, out_points=out_points)
+
+
+def make_welch_log_psd(
+    series: list,
+    fs: float = 1.0,
+    out_points: int = 100,
+    segment_len: int = 262144,
+    overlap: float = 0.5,
+    window: str = "hann",
+    workers: Optional[int] = None,
+    batch_len: int = 2**24,
+) -> np.ndarray:
+    """Estimate log-sampled PSD from equi-sampled data using Welch's method.
+
+    Input:
+        series:
+            Equi-sampled data.
+        fs:
+            Sampling frequency of the data.
+        out_points:
+            Desired number of points in the output PSD.
+            Lower resolution of the PSD is obtained by
+            averaging over binned FFT output.
+        segment_len:
+            Length of a segment (rounded up to a power of 2).
+        overlap:
+            Fraction of the segment length shared by
+            the consecutive segments.
+        window:
+            Window function applied to each segment
+            (see `scipy.signal.get_window`).
+        workers:
+            Number of threads used to compute FFT.
+        batch_len:
+            Maximum number of values transformed by a
+            single FFT call. Segments are transformed in
+            batches to bound memory usage.
+
+    Output:
+        Two dimensional ndarray. Firt column - frequencies,
+        the second column - estimated PSD at those frequencies.
+    """
+    series = np.asarray(series, dtype=float)
+    segment_len = __to_pow_2(segment_len)
+    if len(series) < segment_len:
+        segment_len = int(__to_pow_2(len(series)) / 2)
+    step = max(segment_len - int(overlap * segment_len), 1)
+    # strided view of all (overlapping) segments, no copy is made
+    segments = np.lib.stride_tricks.sliding_window_view(series, segment_len)[::step]
+
+    win = sp.get_window(window, segment_len)
+    batch_size = max(batch_len // segment_len, 1)
+    power = np.zeros(segment_len // 2 + 1)
+    for start in range(0, len(segments), batch_size):
+        with stage("psd.segment"):
+            batch = segments[start : start + batch_size]
+            batch = (batch - np.mean(batch, axis=1, keepdims=True)) * win
+        with stage("psd.fft"):
+            spectra = sp_fft.rfft(batch, axis=1, workers=workers)
+            power += np.sum(spectra.real**2 + spectra.imag**2, axis=0)
+    # average over segments, normalize to one-sided density
+    power = power / (len(segments) * fs * np.sum(win**2))
+    power[1:] = 2 * power[1:]
+    if segment_len % 2 == 0:
+        power[-1] = power[-1] / 2
+    freqs = sp_fft.rfftfreq(segment_len, d=1.0 / fs)
+
+    return __log_bin(np.vstack((freqs, power)).T, out_points)
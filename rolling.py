@@ -0,0 +1,89 @@
+from typing import Tuple
+
+import numpy as np
+
+
+def window_segments(
+    length: int, window: int, step: int, segment_size: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Locate segments within rolling windows.
+
+    Segments of `segment_size` are aligned to a single grid over the whole
+    series (k-th segment covers `[k * segment_size, (k + 1) * segment_size)`),
+    hence neighbouring windows share most of them. Window `i` covers
+    `[i * step, i * step + window)` and contains every segment, which fits in
+    it completely.
+
+    Output:
+        Indices of the first and the last segment of every window.
+    """
+    starts = np.arange(0, length - window + 1, step)
+    first = -(-starts // segment_size)
+    last = (starts + window) // segment_size - 1
+    if len(starts) == 0:
+        raise ValueError("Series is shorter than a single window")
+    if np.min(last - first) < 0:
+        raise ValueError(f"Window can not hold a segment of size {segment_size}")
+    return first, last
+
+
+def __blocks(values: np.ndarray, block_len: int, fill: float) -> np.ndarray:
+    # Split values (along the last axis) into blocks of `block_len`, the last
+    # block is padded with `fill`.
+    n_values = values.shape[-1]
+    n_blocks = -(-n_values // block_len)
+    padded = np.full(values.shape[:-1] + (n_blocks * block_len,), fill)
+    padded[..., :n_values] = values
+    return padded.reshape(values.shape[:-1] + (n_blocks, block_len))
+
+
+def __block_scans(blocks: np.ndarray, n_values: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Prefix and suffix sums within every block, flattened back.
+    shape = blocks.shape[:-2] + (-1,)
+    prefix = np.cumsum(blocks, axis=-1).reshape(shape)[..., :n_values]
+    suffix = np.cumsum(blocks[..., ::-1], axis=-1)[..., ::-1].reshape(shape)
+    return prefix, suffix[..., :n_values]
+
+
+def __block_len(first: np.ndarray, last: np.ndarray) -> int:
+    # Windows hold either n or n + 1 segments. If blocks are n segments long,
+    # every window is either a complete block or a suffix of one block
+    # followed by a prefix of the next one.
+    return max(int(np.min(last - first)) + 1, 1)
+
+
+def window_sums(values: np.ndarray, first: np.ndarray, last: np.ndarray) -> np.ndarray:
+    """Sum segment values (along the last axis) within every window.
+
+    Sums are combined from prefix and suffix sums within blocks of
+    segments, so the cost per window does not depend on its length and,
+    unlike running sums, there is no cancellation when large values leave
+    the window.
+    """
+    block_len = __block_len(first, last)
+    prefix, suffix = __block_scans(__blocks(values, block_len, 0.0), values.shape[-1])
+    split = first // block_len != last // block_len
+    return suffix[..., first] + np.where(split, prefix[..., last], 0.0)
+
+
+def window_log_sums(
+    log_values: np.ndarray, first: np.ndarray, last: np.ndarray
+) -> np.ndarray:
+    """Obtain log(sum(exp(log_values))) within every window.
+
+    Same as `window_sums`, but the values are given (and sums returned) in
+    log domain. Every block is scaled by its own peak, so that large
+    exponents do not overflow.
+    """
+    n_values = log_values.shape[-1]
+    block_len = __block_len(first, last)
+    blocks = __blocks(log_values, block_len, -np.inf)
+    peaks = np.max(blocks, axis=-1, keepdims=True)
+    peaks = np.where(np.isfinite(peaks), peaks, 0.0)
+    prefix, suffix = __block_scans(np.exp(blocks - peaks), n_values)
+    peaks = np.broadcast_to(peaks, blocks.shape).reshape(prefix.shape[:-1] + (-1,))
+    log_prefix = peaks[..., :n_values] + np.log(prefix)
+    log_suffix = peaks[..., :n_values] + np.log(suffix)
+    split = first // block_len != last // block_len
+    total = log_suffix[..., first]
+    return np.where(split, np.logaddexp(total, log_prefix[..., last]), total)
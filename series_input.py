@@ -0,0 +1,227 @@
+import os
+from collections.abc import Iterator
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .profiling import stage
+
+CHUNK_SIZE = 2**20
+
+
+def is_chunk_iterator(source: Any) -> bool:
+    """Check whether the series is given as an iterator over chunks."""
+    return isinstance(source, Iterator)
+
+
+def is_out_of_core(source: Any) -> bool:
+    """Check whether the series should be processed chunk by chunk.
+
+    Memory-mapped arrays, paths to .npy files and chunk iterators are
+    processed chunk by chunk, other inputs are treated as in-memory arrays.
+    """
+    return isinstance(source, (np.memmap, str, os.PathLike)) or is_chunk_iterator(
+        source
+    )
+
+
+def load_series(source: Any) -> np.ndarray:
+    """Obtain array backed by the source without copying it.
+
+    Paths to .npy files are memory-mapped (read only), arrays (including
+    `np.memmap`) are returned as they are, other inputs are converted by
+    `np.asarray`. Chunk iterators can not be loaded.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return np.load(source, mmap_mode="r")
+    if is_chunk_iterator(source):
+        raise ValueError("Chunk iterator can not be accessed as an array")
+    if isinstance(source, np.ndarray):
+        return source
+    return np.asarray(source)
+
+
+def iter_chunks(
+    source: Any, chunk_size: int = CHUNK_SIZE, dtype: Optional[type] = None
+) -> Iterable[np.ndarray]:
+    """Iterate over consecutive chunks of the series.
+
+    In-memory arrays are yielded as a single chunk, memory-mapped arrays and
+    .npy files are read `chunk_size` values at a time, chunks of chunk
+    iterators are passed through. Conversion to `dtype` copies only the
+    chunks, which are not of that type already.
+    """
+    if is_chunk_iterator(source):
+        for chunk in source:
+            yield np.asarray(chunk, dtype=dtype)
+        return
+    series = load_series(source)
+    if not isinstance(series, np.memmap):
+        yield np.asarray(series, dtype=dtype)
+        return
+    for start in range(0, len(series), chunk_size):
+        yield np.asarray(series[start : start + chunk_size], dtype=dtype)
+
+
+def series_range(source: Any) -> Tuple[float, float]:
+    """Obtain minimum and maximum of the series (reading it chunk by chunk)."""
+    if is_chunk_iterator(source):
+        raise ValueError("Range of a chunk iterator is not known in advance")
+    low, high = np.inf, -np.inf
+    with stage("series_input.range"):
+        for chunk in iter_chunks(source):
+            if len(chunk) > 0:
+                low = min(low, np.min(chunk))
+                high = max(high, np.max(chunk))
+    return low, high
+
+
+def fill_range(
+    source: Any, start: Optional[float], stop: Optional[float]
+) -> Tuple[float, float]:
+    """Replace missing range bounds by minimum and maximum of the series."""
+    if start is None or stop is None:
+        low, high = series_range(source)
+        start = low if start is None else start
+        stop = high if stop is None else stop
+    return start, stop
+
+
+def series_mean(source: Any) -> float:
+    """Obtain mean of the series (reading it chunk by chunk)."""
+    if is_chunk_iterator(source):
+        raise ValueError("Mean of a chunk iterator is not known in advance")
+    total = 0.0
+    length = 0
+    with stage("series_input.mean"):
+        for chunk in iter_chunks(source, dtype=float):
+            total += np.sum(chunk)
+            length += len(chunk)
+    return total / length
+
+
+def iter_profile(
+    chunks: Iterable[np.ndarray], center: Optional[float] = None
+) -> Iterable[np.ndarray]:
+    """Iterate over chunks of the profile, cumsum(series - center).
+
+    If `center` is not given, mean of the first chunk is used.
+    """
+    offset = 0.0
+    for chunk in chunks:
+        if len(chunk) == 0:
+            continue
+        if center is None:
+            center = np.mean(chunk)
+        profile = np.cumsum(chunk - center)
+        profile += offset
+        offset = profile[-1]
+        yield profile
+
+
+def iter_segments(
+    chunks: Iterable[np.ndarray],
+    segment_sizes: Sequence[int],
+    offsets: Optional[Sequence[int]] = None,
+) -> Iterable[Iterable[np.ndarray]]:
+    """Split chunked series into non-overlapping segments of several sizes.
+
+    Segments of size `segment_sizes[i]` start at `offsets[i]` (0 by default)
+    and follow one another. For every chunk an iterator over two dimensional
+    arrays (segments x size), one for every size, is yielded; it has to be
+    consumed before advancing to the next chunk. Values not filling a
+    complete segment are carried over to the next chunk, incomplete segments
+    at the end are dropped. Hence all sizes are served by a single pass over
+    the series, while segments of only one size are held in memory at once.
+    """
+    if offsets is None:
+        offsets = [0] * len(segment_sizes)
+    skip = list(offsets)
+    carry = [np.zeros(0)] * len(segment_sizes)
+
+    def _blocks(chunk: np.ndarray) -> Iterable[np.ndarray]:
+        for idx, size in enumerate(segment_sizes):
+            data = chunk
+            if skip[idx] > 0:
+                cut = min(skip[idx], len(data))
+                data = data[cut:]
+                skip[idx] -= cut
+            if len(carry[idx]) > 0:
+                data = np.concatenate((carry[idx], data))
+            n_segments = len(data) // size
+            # chunk buffers may be reused by the iterator, keep a copy
+            carry[idx] = np.array(data[n_segments * size :])
+            yield data[: n_segments * size].reshape(n_segments, size)
+
+    for chunk in chunks:
+        yield _blocks(chunk)
+
+
+def __mapped_file(series: np.ndarray) -> Optional[Tuple[str, int]]:
+    # file name and byte offset of a contiguous memory-mapped series (or of
+    # its view), None if the series is not backed by a file (copy-on-write
+    # changes are not visible to other processes)
+    root = series
+    while isinstance(root.base, np.ndarray):
+        root = root.base
+    if (
+        not isinstance(root, np.memmap)
+        or root.filename is None
+        or root.mode == "c"
+        or series.ndim != 1
+        or not series.flags.c_contiguous
+    ):
+        return None
+    return root.filename, root.offset + series.ctypes.data - root.ctypes.data
+
+
+@contextmanager
+def shared_series(series: Any) -> Iterator[Tuple[str, int, str, Optional[int]]]:
+    """Share the series with worker processes for the lifetime of the context.
+
+    Memory-mapped series (and .npy files) are shared through the file they
+    are mapped from, other series are copied into shared memory once.
+
+    Output:
+        Handle (name, length, dtype, offset) of the series, which worker
+        processes pass to `attach_shared_series` (e.g., in the pool
+        initializer), so that the series is not pickled for every worker.
+        Name is either the file name (and offset is the position of the
+        series in it) or the name of the shared memory block (and offset
+        is None).
+    """
+    series = load_series(series)
+    mapped = __mapped_file(series)
+    if mapped is not None:
+        yield mapped[0], len(series), series.dtype.str, mapped[1]
+        return
+    shm = shared_memory.SharedMemory(create=True, size=max(series.nbytes, 1))
+    try:
+        shared = np.ndarray(series.shape, dtype=series.dtype, buffer=shm.buf)
+        shared[:] = series
+        del shared
+        yield shm.name, len(series), series.dtype.str, None
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+# shared memory attached by the current (worker) process
+__attached: Dict[str, shared_memory.SharedMemory] = {}
+
+
+def attach_shared_series(
+    name: str, length: int, dtype: str, offset: Optional[int] = None
+) -> np.ndarray:
+    """Obtain the series shared by `shared_series` without copying it.
+
+    Files are memory-mapped (read only), shared memory stays attached for
+    the lifetime of the process.
+    """
+    if offset is not None:
+        return np.memmap(name, dtype=dtype, mode="r", offset=offset, shape=(length,))
+    if name not in __attached:
+        __attached[name] = shared_memory.SharedMemory(name=name)
+    return np.ndarray((length,), dtype=dtype, buffer=__attached[name].buf)
@@ -0,0 +1,331 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+import scipy.fft as sp_fft  # type: ignore
+
+from .profiling import stage
+from .series_input import attach_shared_series, load_series, shared_series
+
+Seed = Optional[Any]
+
+
+def shuffle_surrogates(
+    series: np.ndarray, n_surrogates: int, seed: Seed = None
+) -> np.ndarray:
+    """Generate shuffled surrogates.
+
+    Shuffling preserves the distribution of values, but destroys all
+    temporal correlations.
+
+    Output:
+        Two dimensional ndarray (surrogates x time).
+    """
+    rng = np.random.default_rng(seed)
+    series = np.asarray(series, dtype=float)
+    return rng.permuted(np.tile(series, (n_surrogates, 1)), axis=1)
+
+
+def phase_surrogates(
+    series: np.ndarray, n_surrogates: int, seed: Seed = None
+) -> np.ndarray:
+    """Generate phase-randomized (Fourier transform) surrogates.
+
+    Randomization of the Fourier phases preserves the power spectrum (and
+    thus linear correlations), but the distribution of values becomes
+    Gaussian. All surrogates are obtained by a single batched FFT.
+
+    Output:
+        Two dimensional ndarray (surrogates x time).
+    """
+    rng = np.random.default_rng(seed)
+    series = np.asarray(series, dtype=float)
+    spectrum = sp_fft.rfft(series)
+    phases = rng.uniform(0, 2 * np.pi, (n_surrogates, len(spectrum)))
+    # mean (and the Nyquist component) must stay real
+    phases[:, 0] = 0
+    if len(series) % 2 == 0:
+        phases[:, -1] = 0
+    return sp_fft.irfft(spectrum * np.exp(1j * phases), n=len(series), axis=1)
+
+
+def iaaft_surrogates(
+    series: np.ndarray, n_surrogates: int, seed: Seed = None, max_iter: int = 100
+) -> np.ndarray:
+    """Generate iterative amplitude adjusted Fourier transform surrogates.
+
+    IAAFT surrogates preserve the distribution of values exactly and the
+    power spectrum approximately (Schreiber & Schmitz, Phys. Rev. Lett. 77,
+    635, 1996). Spectrum and rank order adjustments are done for all
+    surrogates at once, iterations stop once the rank order of none of the
+    surrogates changes (or after `max_iter` iterations).
+
+    Output:
+        Two dimensional ndarray (surrogates x time).
+    """
+    series = np.asarray(series, dtype=float)
+    sorted_values = np.sort(series)
+    amplitudes = np.abs(sp_fft.rfft(series))
+    surrogates = shuffle_surrogates(series, n_surrogates, seed=seed)
+    ranks = np.argsort(surrogates, axis=1)
+    for _ in range(max_iter):
+        # impose the power spectrum
+        spectra = sp_fft.rfft(surrogates, axis=1)
+        spectra = amplitudes * np.exp(1j * np.angle(spectra))
+        surrogates = sp_fft.irfft(spectra, n=len(series), axis=1)
+        # impose the distribution of values
+        new_ranks = np.argsort(surrogates, axis=1)
+        np.put_along_axis(surrogates, new_ranks, sorted_values[None, :], axis=1)
+        if np.array_equal(new_ranks, ranks):
+            break
+        ranks = new_ranks
+    return surrogates
+
+
+SURROGATES: Dict[str, Callable[..., np.ndarray]] = {
+    "shuffle": shuffle_surrogates,
+    "phase": phase_surrogates,
+    "iaaft": iaaft_surrogates,
+}
+
+
+def block_bootstrap(
+    series: np.ndarray,
+    n_samples: int,
+    seed: Seed = None,
+    block_size: Optional[int] = None,
+) -> np.ndarray:
+    """Generate circular block bootstrap resamples.
+
+    Resamples are concatenations of blocks of `block_size` consecutive
+    values starting at random positions (blocks wrap around the end of the
+    series), cut to the length of the series. Correlations within the
+    blocks are preserved, so the block size should exceed the largest scale
+    used by the estimator (square root of the length by default). All
+    resamples are gathered by a single fancy indexing operation.
+
+    Output:
+        Two dimensional ndarray (resamples x time).
+    """
+    rng = np.random.default_rng(seed)
+    series = np.asarray(series, dtype=float)
+    length = len(series)
+    if block_size is None:
+        block_size = int(np.ceil(np.sqrt(length)))
+    n_blocks = -(-length // block_size)
+    starts = rng.integers(0, length, (n_samples, n_blocks, 1))
+    idx = (starts + np.arange(block_size)) % length
+    return series[idx.reshape(n_samples, -1)[:, :length]]
+
+
+def __evaluate_batch(
+    series: np.ndarray,
+    estimator: Callable,
+    generate: Callable[..., np.ndarray],
+    batched: bool,
+    seed: np.random.SeedSequence,
+    n_samples: int,
+) -> np.ndarray:
+    with stage("surrogates.generate"):
+        samples = generate(series, n_samples, seed=seed)
+    with stage("surrogates.estimate"):
+        if batched:
+            return np.asarray(estimator(samples))
+        return np.array([estimator(sample) for sample in samples])
+
+
+# state of the worker processes, set once by the pool initializer
+__worker_state: Dict[str, Any] = {}
+
+
+def __init_worker(
+    handle: Tuple[str, int, str, Optional[int]],
+    estimator: Callable,
+    generate: Callable[..., np.ndarray],
+    batched: bool,
+) -> None:
+    __worker_state.update(
+        series=attach_shared_series(*handle),
+        estimator=estimator,
+        generate=generate,
+        batched=batched,
+    )
+
+
+def __worker_batch(seed: np.random.SeedSequence, n_samples: int) -> np.ndarray:
+    return __evaluate_batch(seed=seed, n_samples=n_samples, **__worker_state)
+
+
+def __sample_exponents(
+    series: np.ndarray,
+    estimator: Callable,
+    generate: Callable[..., np.ndarray],
+    n_samples: int,
+    confidence: float,
+    batched: bool,
+    batch_size: int,
+    workers: Optional[int],
+    seed: Seed,
+) -> Tuple[Any, np.ndarray, np.ndarray, np.ndarray]:
+    # estimates for the series and for the generated samples together with
+    # the central `confidence` quantile range of the latter
+    source = load_series(series)
+    series = np.asarray(source, dtype=float)
+    counts = [
+        min(batch_size, n_samples - start) for start in range(0, n_samples, batch_size)
+    ]
+    seeds = np.random.SeedSequence(seed).spawn(len(counts))
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1 or len(counts) == 1:
+        batches = [
+            __evaluate_batch(series, estimator, generate, batched, batch_seed, count)
+            for batch_seed, count in zip(seeds, counts)
+        ]
+    else:
+        # series is shared through shared memory (or through the file it is
+        # mapped from) instead of pickling it for every worker; stages
+        # executed by the workers are not recorded
+        with shared_series(source) as handle:
+            with stage("surrogates.pool"), ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=__init_worker,
+                initargs=(handle, estimator, generate, batched),
+            ) as pool:
+                # results arrive in submission order
+                batches = list(pool.map(__worker_batch, seeds, counts))
+
+    samples = np.concatenate(batches)
+    with stage("surrogates.quantiles"):
+        low, high = np.quantile(
+            samples, [(1 - confidence) / 2, (1 + confidence) / 2], axis=0
+        )
+    value = estimator(series[None, :])[0] if batched else estimator(series)
+    return value, samples, low, high
+
+
+def surrogate_exponent_band(
+    series: np.ndarray,
+    estimator: Callable,
+    n_surrogates: int = 100,
+    method: str = "shuffle",
+    confidence: float = 0.95,
+    batched: bool = False,
+    batch_size: int = 16,
+    workers: Optional[int] = 1,
+    seed: Seed = None,
+) -> Tuple[Any, np.ndarray, np.ndarray, np.ndarray]:
+    """Compare scaling exponent of the series against its surrogates.
+
+    Surrogates share selected properties of the series, but are otherwise
+    random, so their exponents form a band expected under the null
+    hypothesis (no temporal correlations for "shuffle", a linear Gaussian
+    process for "phase" and "iaaft"). The exponent of the series falling
+    outside of the band rejects the null hypothesis. The band is not a
+    confidence interval of the estimate itself (see
+    `bootstrap_exponent_interval`).
+
+    Input:
+        series:
+            One dimensional series (ndarray, `np.memmap` or path to .npy
+            file; workers map files instead of receiving a copy).
+        estimator:
+            Function mapping series to an exponent (or an array of
+            exponents), e.g. `functools.partial(MakeMfDfa, qSample=q,
+            scaleSample=scales)`. It has to be picklable if `workers`
+            is not 1.
+        n_surrogates:
+            Number of surrogates.
+        method:
+            Kind of surrogates: "shuffle" (`shuffle_surrogates`), "phase"
+            (`phase_surrogates`) or "iaaft" (`iaaft_surrogates`).
+        confidence:
+            Probability mass of the surrogate distribution within the
+            returned band.
+        batched:
+            Whether the estimator takes a two dimensional array
+            (surrogates x time) and returns the result for every row, e.g.
+            `MakeMfDfaPanel`.
+        batch_size:
+            Number of surrogates generated (and evaluated) at once.
+        workers:
+            Number of worker processes (`None` - number of CPUs).
+        seed:
+            Seed of the random number generator. Every batch is generated
+            with its own seed spawned from it, so the output does not depend
+            on the number of workers.
+
+    Output:
+        Tuple of the estimate for the series, estimates for the
+        surrogates (first axis corresponds to surrogates) and the lower
+        and upper bounds of the band holding `confidence` of the surrogate
+        estimates.
+    """
+    if method not in SURROGATES:
+        raise ValueError(f"Unknown method: {method}")
+    return __sample_exponents(
+        series,
+        estimator,
+        SURROGATES[method],
+        n_surrogates,
+        confidence,
+        batched,
+        batch_size,
+        workers,
+        seed,
+    )
+
+
+def bootstrap_exponent_interval(
+    series: np.ndarray,
+    estimator: Callable,
+    n_samples: int = 100,
+    block_size: Optional[int] = None,
+    confidence: float = 0.95,
+    batched: bool = False,
+    batch_size: int = 16,
+    workers: Optional[int] = 1,
+    seed: Seed = None,
+) -> Tuple[Any, np.ndarray, np.ndarray, np.ndarray]:
+    """Obtain block bootstrap confidence interval of the scaling exponent.
+
+    The estimator is evaluated on circular block bootstrap resamples of the
+    series (`block_bootstrap`), the percentile interval of the resampled
+    estimates is returned. Unlike `surrogate_exponent_band` this quantifies
+    the uncertainty of the estimate itself. Resamples are generated and
+    evaluated in batches exactly as surrogates are.
+
+    Input:
+        series:
+            One dimensional series.
+        estimator:
+            Function mapping series to an exponent (or an array of
+            exponents), see `surrogate_exponent_band`.
+        n_samples:
+            Number of bootstrap resamples.
+        block_size:
+            Length of the resampled blocks (see `block_bootstrap`).
+        confidence:
+            Confidence level of the interval.
+        batched, batch_size, workers, seed:
+            See `surrogate_exponent_band`.
+
+    Output:
+        Tuple of the estimate for the series, estimates for the resamples
+        (first axis corresponds to resamples) and the lower and upper
+        bounds of the confidence interval.
+    """
+    return __sample_exponents(
+        series,
+        estimator,
+        partial(block_bootstrap, block_size=block_size),
+        n_samples,
+        confidence,
+        batched,
+        batch_size,
+        workers,
+        seed,
+    )
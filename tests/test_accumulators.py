@@ -0,0 +1,159 @@
+from collections import Counter
+
+import numpy as np
+
+from ..cdf import cdf_from_histogram, make_cdf
+from ..histogram import HistogramAccumulator, right_histogram
+from ..kramers_moyal import KramersMoyalAccumulator, get_km_table
+from ..pdf import make_log_pdf, make_pdf, pdf_from_histogram
+from ..pmf import PmfAccumulator, make_pmf
+
+
+def _chunks(data, n_chunks=7):
+    return np.array_split(data, n_chunks)
+
+
+def _reference_right_histogram(data, start, stop, out_points):
+    # Counter-based implementation the accumulator replaced
+    idx = np.ceil(
+        (data[(start <= data) & (data <= stop)] - start)
+        * (out_points - 1)
+        / (stop - start)
+    ).astype(int)
+    hist = np.zeros(out_points)
+    for key, val in Counter(idx).items():
+        hist[key] = val
+    return hist / len(idx)
+
+
+def test_right_histogram_matches_reference():
+    rng = np.random.default_rng(1)
+    for data in (rng.normal(size=10_000), np.round(rng.normal(size=10_000), 1)):
+        hist, edges = right_histogram(data, -2.0, 2.0, out_points=50)
+        assert np.array_equal(hist, _reference_right_histogram(data, -2.0, 2.0, 50))
+        assert np.array_equal(edges, np.linspace(-2.0, 2.0, 50))
+
+
+def test_histogram_merge_matches_single_pass():
+    data = np.random.default_rng(2).lognormal(size=10_000)
+    for log in (False, True):
+        for right in (False, True):
+            single = HistogramAccumulator(0.1, 10.0, log=log, right=right).update(data)
+            merged = HistogramAccumulator(0.1, 10.0, log=log, right=right)
+            for chunk in _chunks(data):
+                merged.merge(
+                    HistogramAccumulator(0.1, 10.0, log=log, right=right).update(chunk)
+                )
+            assert np.array_equal(merged.counts, single.counts)
+
+
+def test_histogram_finalizers_match_chunked():
+    data = np.random.default_rng(3).lognormal(size=10_000)
+    start, stop = np.min(data), np.max(data)
+    pdf = HistogramAccumulator(start, stop, right=False)
+    log_pdf = HistogramAccumulator(start, stop, log=True, right=False)
+    cdf = HistogramAccumulator(start, stop)
+    for chunk in _chunks(data):
+        pdf.update(chunk)
+        log_pdf.update(chunk)
+        cdf.update(chunk)
+    assert np.array_equal(pdf_from_histogram(pdf), make_pdf(data))
+    assert np.array_equal(pdf_from_histogram(log_pdf), make_log_pdf(data))
+    assert np.array_equal(cdf_from_histogram(cdf), make_cdf(data))
+    assert np.array_equal(make_pdf(iter(_chunks(data)), start, stop), make_pdf(data))
+
+
+def test_pmf_matches_counter():
+    rng = np.random.default_rng(4)
+    dense = rng.integers(-20, 20, size=10_000)
+    sparse = rng.integers(-(10**9), 10**9, size=1000)
+    rounded = np.round(rng.normal(size=10_000), 1)
+    for data in (dense, sparse, rounded):
+        counts = Counter(data.tolist())
+        values = np.array(sorted(counts))
+        expected = np.array(
+            [values, [counts[value] for value in values]], dtype=float
+        ).T
+        expected[:, 1] /= len(data)
+        assert np.array_equal(make_pmf(data), expected)
+
+
+def test_pmf_of_integers_spanning_their_dtype():
+    rng = np.random.default_rng(7)
+    cases = [
+        np.array([-100, 100, 0, 5], dtype=np.int8),
+        rng.integers(-128, 128, size=1000).astype(np.int8),
+        rng.integers(-20_000, 20_000, size=1000).astype(np.int16),
+        np.array([-30_000, 30_000, 0, 0], dtype=np.int16),
+        np.array([-(2**63), 2**63 - 1, 5, 5], dtype=np.int64),
+        np.array([0, 2**64 - 1, 5, 5], dtype=np.uint64),
+    ]
+    for data in cases:
+        values, counts = np.unique(data, return_counts=True)
+        expected = np.array([values, counts / len(data)], dtype=float).T
+        assert np.array_equal(make_pmf(data), expected)
+
+
+def test_pmf_merge_matches_single_pass():
+    data = np.random.default_rng(5).integers(0, 100, size=10_000)
+    weights = np.random.default_rng(6).random(10_000)
+    merged = PmfAccumulator()
+    for chunk, chunk_weights in zip(_chunks(data), _chunks(weights)):
+        merged.merge(PmfAccumulator().update(chunk, weights=chunk_weights))
+    single = PmfAccumulator().update(data, weights=weights)
+    assert np.array_equal(merged.values, single.values)
+    assert np.allclose(merged.counts, single.counts, rtol=1e-12)
+
+
+def _cir(size, seed):
+    rng = np.random.default_rng(seed)
+    series = np.ones(size)
+    for idx in range(1, size):
+        step = (
+            0.01 * (1 - series[idx - 1]) + 0.1 * np.sqrt(series[idx - 1]) * rng.normal()
+        )
+        series[idx] = abs(series[idx - 1] + step)
+    return series
+
+
+def _km_accumulator(lags=(1, 3, 10)):
+    return KramersMoyalAccumulator((1, 2, 4), 20, 0.5, 1.5, lags=lags, delta_t=0.1)
+
+
+def test_kramers_moyal_chunked_and_merged_match_single_pass():
+    series = _cir(5000, 7)
+    x_0, coeff, counts = _km_accumulator().update(series).finalize()
+
+    chunked = _km_accumulator()
+    for chunk in _chunks(series, 50):
+        chunked.update(chunk)
+    merged = _km_accumulator()
+    for chunk in _chunks(series, 13):
+        merged.merge(_km_accumulator().update(chunk))
+    for accumulator in (chunked, merged):
+        result = accumulator.finalize()
+        assert np.array_equal(result[0], x_0)
+        assert np.allclose(result[1], coeff, rtol=1e-12, atol=1e-14)
+        assert np.array_equal(result[2], counts)
+
+
+def test_kramers_moyal_table_matches_masked_means():
+    series = _cir(5000, 8)
+    x_0, coeff, counts = get_km_table((1, 2), 20, series, 0.1)
+    start, stop = np.min(series), np.max(series)
+    binned = np.round((series[:-1] - start) / (stop - start) * 20).astype(int)
+    increments = np.diff(series)
+    for idx in np.flatnonzero(counts):
+        mask = binned == idx
+        assert counts[idx] == np.sum(mask)
+        assert np.isclose(coeff[idx, 0], np.mean(increments[mask]) / 0.1)
+        assert np.isclose(coeff[idx, 1], np.mean(increments[mask] ** 2) / 0.2)
+
+
+def test_right_histogram_counts_value_at_stop_edge():
+    # (stop - start) * 99 / (stop - start) rounds above 99 for these edges
+    data = np.array([0.2, 1.0, 1.5, 1.5])
+    hist, _ = right_histogram(data, 0.2, 1.5, out_points=100, density=False)
+    assert len(hist) == 100
+    assert hist[0] == 1 and hist[-1] == 2 and np.sum(hist) == 4
+    assert make_cdf(data, 0.2, 1.5)[-1, 1] == 1.0
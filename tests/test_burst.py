@@ -0,0 +1,161 @@
+import numpy as np
+
+from ..burstACS import (
+    ExtractBurstData,
+    ExtractBurstDataStream,
+    ExtractBurstSweep,
+    ExtractBurstTable,
+)
+
+THRESH = 0.5
+
+
+def _series(seed=1, size=5000):
+    # AR(1) series crossing the threshold in bursts of various lengths
+    rng = np.random.default_rng(seed)
+    noise = rng.normal(size=size)
+    series = np.zeros(size)
+    for idx in range(1, size):
+        series[idx] = 0.9 * series[idx - 1] + noise[idx]
+    return series
+
+
+def _reference_burst_data(series, thresh, sample_period=1):
+    # per-burst implementation the segmented reductions replaced
+    event_times = np.where(series >= thresh)[0]
+    inter_event = np.diff(event_times)
+    iearr = np.where(inter_event > 1)[0]
+    starts = event_times[iearr[:-1] + 1]
+    ibd = inter_event[iearr[:-1]] - 1
+    bd = np.diff(iearr)
+    burst_max = np.array(
+        [np.max(series[s : s + n] - thresh) for s, n in zip(starts, bd)]
+    )
+    burst_size = np.array(
+        [np.sum(series[s : s + n] - thresh) * sample_period for s, n in zip(starts, bd)]
+    )
+    inter_min = np.array(
+        [
+            np.max(thresh - series[starts[i] - ibd[i] : starts[i]])
+            for i in range(1, len(starts) - 1)
+        ]
+    )
+    inter_size = np.array(
+        [
+            np.sum(thresh - series[starts[i] - ibd[i] : starts[i]]) * sample_period
+            for i in range(1, len(starts) - 1)
+        ]
+    )
+    return (
+        bd * sample_period,
+        burst_max,
+        burst_size,
+        ibd * sample_period,
+        inter_min,
+        inter_size,
+    )
+
+
+def _burst_data(source, **kwargs):
+    return ExtractBurstData(
+        source, THRESH, returnInterBurst=True, extractOther=True, **kwargs
+    )
+
+
+def _assert_identical(result, expected):
+    assert len(result) == len(expected)
+    for column, expected_column in zip(result, expected):
+        assert np.array_equal(column, expected_column)
+
+
+def _assert_stream_matches(result, expected):
+    # sizes of records spanning chunk boundaries are summed chunk by chunk
+    assert len(result) == len(expected)
+    for idx, (column, expected_column) in enumerate(zip(result, expected)):
+        if idx in (2, 5):
+            assert np.allclose(column, expected_column, rtol=1e-12, atol=0)
+        else:
+            assert np.array_equal(column, expected_column)
+
+
+def test_burst_data_matches_reference():
+    series = _series()
+    _assert_identical(
+        _burst_data(series, samplePeriod=0.1),
+        _reference_burst_data(series, THRESH, sample_period=0.1),
+    )
+
+
+def test_stream_matches_in_memory():
+    series = _series(seed=2)
+    rng = np.random.default_rng(3)
+    for prep_series in (False, True):
+        expected = _burst_data(series, prepSeries=prep_series)
+        for _ in range(5):
+            cuts = np.sort(rng.choice(len(series), size=40, replace=False))
+            chunks = np.split(series, cuts)
+            _assert_stream_matches(
+                ExtractBurstDataStream(
+                    chunks,
+                    THRESH,
+                    returnInterBurst=True,
+                    extractOther=True,
+                    prepSeries=prep_series,
+                ),
+                expected,
+            )
+
+
+def test_stream_of_single_values():
+    series = _series(seed=4, size=500)
+    _assert_stream_matches(
+        ExtractBurstDataStream(
+            ([value] for value in series),
+            THRESH,
+            returnInterBurst=True,
+            extractOther=True,
+        ),
+        _burst_data(series),
+    )
+
+
+def test_stream_of_long_gap_and_burst():
+    # one gap and one burst span hundreds of chunks; values lie on a dyadic
+    # grid, so that sizes do not depend on the order of summation
+    series = np.round(_series(seed=7, size=2000) * 64) / 64
+    gap = -1 - np.round(np.random.default_rng(8).random(3000) * 64) / 64
+    burst = 1 + np.round(np.random.default_rng(9).random(3000) * 64) / 64
+    series = np.concatenate((series, gap, burst, series))
+    chunks = np.split(series, np.arange(7, len(series), 7))
+    expected = _burst_data(series)
+    assert 3000 in expected[0] and np.max(expected[3]) >= 3000
+    _assert_identical(
+        ExtractBurstDataStream(
+            chunks, THRESH, returnInterBurst=True, extractOther=True
+        ),
+        expected,
+    )
+
+
+def test_npy_file_matches_in_memory(tmp_path):
+    series = _series(seed=5)
+    path = str(tmp_path / "series.npy")
+    np.save(path, series)
+    _assert_identical(_burst_data(path), _burst_data(series))
+
+
+def test_sweep_matches_table():
+    series = _series(seed=6)
+    thresholds = np.array([1.0, -0.5, 0.0, 2.0])
+    sweep = ExtractBurstSweep(series, thresholds, extractOther=True)
+    for idx, thresh in enumerate(thresholds):
+        table = ExtractBurstTable(series, thresh)
+        rows = slice(sweep["offsets"][idx], sweep["offsets"][idx + 1])
+        other = slice(sweep["otherOffsets"][idx], sweep["otherOffsets"][idx + 1])
+        for key in ("burstDuration", "interBurstDuration", "burstMax"):
+            assert np.array_equal(sweep[key][rows], table[key])
+        assert np.array_equal(sweep["interBurstMin"][other], table["interBurstMin"])
+        assert np.allclose(sweep["burstSize"][rows], table["burstSize"], rtol=1e-10)
+        assert np.allclose(
+            sweep["interBurstSize"][other], table["interBurstSize"], rtol=1e-10
+        )
@@ -0,0 +1,74 @@
+import os
+
+import numpy as np
+
+from ..cache import ResultCache, disable_cache, enable_cache
+from ..hurst import RescaledRange
+from ..mfdfa import MakeMfDfa
+from ..psd import make_log_psd
+
+
+def _spilled_files(cache):
+    return sorted(os.listdir(cache.spill_dir))
+
+
+def test_eviction_spills_within_disk_budget(tmp_path):
+    cache = ResultCache(max_bytes=800, spill_dir=str(tmp_path), max_disk_bytes=1600)
+    for idx in range(5):
+        cache.put(f"k{idx}", np.full(100, float(idx)))
+    assert cache.nbytes == 800 and cache.disk_nbytes == 1600
+    assert _spilled_files(cache) == ["k2.npy", "k3.npy"]
+    # the oldest arrays were deleted from disk
+    assert cache.get("k0") is None and cache.get("k1") is None
+    # loaded array moves back to memory, its file is removed
+    assert np.array_equal(cache.get("k2"), np.full(100, 2.0))
+    assert _spilled_files(cache) == ["k3.npy", "k4.npy"]
+    cache.clear()
+    assert _spilled_files(cache) == [] and cache.disk_nbytes == 0
+    spill_dir = cache.spill_dir
+    cache.close()
+    assert not os.path.exists(spill_dir)
+    assert os.listdir(tmp_path) == []
+
+
+def test_arrays_larger_than_memory_stay_on_disk(tmp_path):
+    cache = ResultCache(max_bytes=100, spill_dir=str(tmp_path), max_disk_bytes=1000)
+    cache.put("large", np.ones(50))
+    cache.put("too large", np.ones(200))
+    assert cache.nbytes == 0 and _spilled_files(cache) == ["large.npy"]
+    assert np.array_equal(cache.get("large"), np.ones(50))
+    assert _spilled_files(cache) == ["large.npy"]
+    assert cache.get("too large") is None
+
+
+def test_disable_cache_removes_spilled_files(tmp_path):
+    cache = enable_cache(max_bytes=0, spill_dir=str(tmp_path))
+    make_log_psd(np.random.default_rng(1).normal(size=1024))
+    assert len(_spilled_files(cache)) == 1
+    disable_cache()
+    assert os.listdir(tmp_path) == []
+
+
+def test_cached_results_match_uncached():
+    series = np.random.default_rng(2).normal(size=4096)
+    q_sample = np.array([-2.0, 2.0])
+    scales = np.array([16, 32, 64, 128])
+
+    def _results():
+        return (
+            MakeMfDfa(series, q_sample, scales),
+            RescaledRange(series, 10, 400),
+            make_log_psd(series),
+        )
+
+    expected = _results()
+    cache = enable_cache()
+    try:
+        first = _results()
+        second = _results()
+        assert cache.hits > 0
+    finally:
+        disable_cache()
+    for result in (first, second):
+        for value, expected_value in zip(result, expected):
+            assert np.array_equal(value, expected_value)
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from ..cdf import QuantileSketch, make_ecdf, make_log_ecdf
+
+# rank error bound stated in the QuantileSketch docstring (k=200)
+RANK_ERROR = 0.017
+
+
+def _exact_cdf(data, points):
+    return np.searchsorted(np.sort(data), points, side="right") / len(data)
+
+
+def test_ecdf_matches_searchsorted():
+    # integer sample has many ties, points extend beyond the sample range
+    data = np.random.default_rng(1).integers(0, 20, size=1000)
+    points = np.concatenate((np.linspace(-5, 25, 61), np.arange(20)))
+    ecdf = make_ecdf(data, points=points)
+    assert np.array_equal(ecdf[:, 0], points)
+    assert np.array_equal(ecdf[:, 1], _exact_cdf(data, points))
+    assert np.all(ecdf[points < 0, 1] == 0) and np.all(ecdf[points >= 19, 1] == 1)
+    unique = make_ecdf(data)
+    assert np.array_equal(unique[:, 0], np.unique(data))
+    assert np.array_equal(unique[:, 1], _exact_cdf(data, np.unique(data)))
+
+
+def test_survival_on_log_grid():
+    data = np.random.default_rng(2).pareto(1.5, size=10_000) + 1
+    ecdf = make_log_ecdf(data, out_points=50)
+    survival = make_log_ecdf(data, out_points=50, survival=True)
+    assert np.array_equal(survival[:, 0], ecdf[:, 0])
+    assert np.isclose(survival[0, 0], np.min(data))
+    assert np.isclose(survival[-1, 0], np.max(data))
+    # P(X >= x) differs from 1 - P(X <= x) only at the sample values, here
+    # the end points of the grid
+    assert np.allclose(survival[1:-1, 1], 1 - ecdf[1:-1, 1])
+    assert survival[0, 1] == 1 and survival[-1, 1] == 1 / len(data)
+    assert ecdf[0, 1] == 1 / len(data) and ecdf[-1, 1] == 1
+
+
+def _rank_error(sketch, data):
+    points = np.quantile(data, np.linspace(0, 1, 1001))
+    return np.max(np.abs(sketch.cdf(points)[:, 1] - _exact_cdf(data, points)))
+
+
+def test_sketch_rank_error():
+    data = np.random.default_rng(3).lognormal(size=10**6)
+    sketch = QuantileSketch(seed=4)
+    for chunk in np.array_split(data, 100):
+        sketch.update(chunk)
+    assert sketch.n == len(data)
+    assert sum(len(items) for items in sketch.levels) <= 3 * sketch.k
+    assert _rank_error(sketch, data) < RANK_ERROR
+    probs = np.linspace(0.01, 0.99, 99)
+    ranks = _exact_cdf(data, sketch.quantile(probs))
+    assert np.max(np.abs(ranks - probs)) < RANK_ERROR
+    survival = sketch.cdf(np.quantile(data, [0.5, 0.9]), survival=True)
+    assert np.allclose(survival[:, 1], [0.5, 0.1], atol=RANK_ERROR)
+
+
+def test_merged_sketch_rank_error():
+    data = np.random.default_rng(5).lognormal(size=10**6)
+    first, second = QuantileSketch(seed=6), QuantileSketch(seed=7)
+    for chunk in np.array_split(data[:600_000], 37):
+        first.update(chunk)
+    for chunk in np.array_split(data[600_000:], 23):
+        second.update(chunk)
+    merged = first.merge(second)
+    assert merged.n == len(data)
+    assert _rank_error(merged, data) < RANK_ERROR
+    with pytest.raises(ValueError):
+        merged.merge(QuantileSketch(k=100))
+
+
+def test_empty_sketch():
+    sketch = QuantileSketch()
+    with pytest.raises(ValueError):
+        sketch.cdf([0.0])
+    with pytest.raises(ValueError):
+        sketch.quantile([0.5])
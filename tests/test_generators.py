@@ -0,0 +1,23 @@
+import numpy as np
+
+from ..benchmarks.generators import arch
+
+
+def _reference_arch(n, omega, alpha, seed):
+    # sample by sample recursion the vectorized scan replaced
+    noise = np.random.default_rng(seed).standard_normal(n)
+    series = np.zeros(n)
+    prev = 0.0
+    for idx, z in enumerate(noise):
+        prev = np.sqrt(omega + alpha * prev**2) * z
+        series[idx] = prev
+    return series
+
+
+def test_arch_matches_recursion():
+    for n in (1, 16, 17, 1000, 4099):
+        expected = _reference_arch(n, 1.0, 0.5, seed=n)
+        # chunks of several sizes, including ones shorter than a scan block
+        for chunk_size in (5, 64, 1000, 2**20):
+            result = arch(n, 1.0, 0.5, seed=n, chunk_size=chunk_size)
+            assert np.allclose(result, expected, rtol=1e-12, atol=0)
@@ -0,0 +1,66 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from ..higuchi import higuchi_dimension, higuchi_dimension_panel
+
+SCALES = [1, 2, 3, 5, 8, 13, 21, 34]
+
+
+def _reference_mean_length(series, scale):
+    # per-offset implementation the vectorized engine replaced
+    def _rescaled_length(offset):
+        diffs = np.diff(series[offset::scale])
+        n_rescaled = len(diffs) + 1
+        return (len(series) - 1) / (n_rescaled * scale**2) * np.sum(np.abs(diffs))
+
+    return np.mean([_rescaled_length(offset) for offset in range(scale)])
+
+
+def _reference_dimension(series, scales):
+    log_lengths = np.log([_reference_mean_length(series, scale) for scale in scales])
+    return np.polyfit(-np.log(scales), log_lengths, 1)[0]
+
+
+def _series(size=5000, seed=1):
+    return np.cumsum(np.random.default_rng(seed).normal(size=size))
+
+
+def test_higuchi_matches_reference():
+    # length not divisible by most of the scales
+    series = _series(size=4999)
+    expected = _reference_dimension(series, SCALES)
+    assert np.isclose(higuchi_dimension(series, SCALES), expected, rtol=1e-12)
+    # Brownian motion has dimension 1.5, a straight line 1
+    assert abs(expected - 1.5) < 0.1
+    assert abs(higuchi_dimension(np.arange(1000.0), SCALES) - 1) < 0.02
+
+
+def test_higuchi_does_not_depend_on_workers():
+    series = _series(seed=2)
+    assert higuchi_dimension(series, SCALES, workers=1) == higuchi_dimension(
+        series, SCALES, workers=4
+    )
+
+
+def test_higuchi_panel_matches_loop():
+    panel = [_series(size=size, seed=seed) for seed, size in enumerate([800] * 3)]
+    panel += [_series(size=1200, seed=5)]
+    expected = [_reference_dimension(series, SCALES) for series in panel]
+    for workers in (1, 4):
+        result = higuchi_dimension_panel(panel, SCALES, workers=workers, batch_len=1600)
+        assert np.allclose(result, expected, rtol=1e-12)
+
+
+def test_import_does_not_load_matplotlib():
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    package = os.path.basename(package_dir)
+    code = (
+        f"import sys, {package}.higuchi, {package}.mfdfa; "
+        "assert 'matplotlib.pyplot' not in sys.modules"
+    )
+    subprocess.run(
+        [sys.executable, "-c", code], cwd=os.path.dirname(package_dir), check=True
+    )
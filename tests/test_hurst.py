@@ -0,0 +1,121 @@
+import numpy as np
+
+from ..hurst import (
+    BoxCount1D,
+    BoxCount2D,
+    BoxCountPoints2D,
+    RescaledRange,
+    RescaledRangePanel,
+    RollingRescaledRange,
+)
+
+
+def _reference_mean_range(series, segment_size, wrap=True):
+    # per-segment implementation the prefix-sum engine replaced
+    n_segments = len(series) // segment_size
+    segs = series[: n_segments * segment_size].reshape(n_segments, segment_size)
+    if wrap:
+        tail = series[-n_segments * segment_size :].reshape(n_segments, segment_size)
+        segs = np.vstack((segs, tail))
+    prof = np.cumsum(segs, axis=1)
+    rng = np.max(prof, axis=1) - np.min(prof, axis=1)
+    return np.mean(rng / np.std(segs, axis=1))
+
+
+def _reference_rescaled_range(series, low, high, wrap=True, points=100):
+    sizes = np.unique(
+        np.floor(np.logspace(np.log10(low), np.log10(high), num=points)).astype(int)
+    )
+    sizes = sizes[sizes > 1]
+    ranges = [_reference_mean_range(series, size, wrap=wrap) for size in sizes]
+    return np.polyfit(np.log10(sizes), np.log10(ranges), 1)[0]
+
+
+def _reference_box_count(series, low, high, wrap=True, points=100):
+    n_boxes = np.unique(
+        np.floor(np.logspace(np.log10(low), np.log10(high), num=points)).astype(int)
+    )
+    n_boxes = n_boxes[n_boxes > 1]
+    counts = []
+    for n_segments in n_boxes:
+        size = len(series) // n_segments
+        segs = series[: n_segments * size].reshape(n_segments, size)
+        if wrap:
+            tail = series[-n_segments * size :].reshape(n_segments, size)
+            segs = np.vstack((segs, tail))
+        counts.append(np.sum(np.sum(segs, axis=1) > 0) // 2)
+    return np.polyfit(np.log10(n_boxes), np.log10(counts), 1)[0]
+
+
+def _cantor(depth):
+    cantor = np.ones(1, dtype=int)
+    for _ in range(depth):
+        cantor = np.concatenate((cantor, np.zeros_like(cantor), cantor))
+    return cantor
+
+
+def test_rescaled_range_matches_reference():
+    series = np.random.default_rng(1).normal(size=20_000)
+    for wrap in (True, False):
+        assert np.isclose(
+            RescaledRange(series, 10, 2000, wrap=wrap),
+            _reference_rescaled_range(series, 10, 2000, wrap=wrap),
+            rtol=1e-12,
+        )
+
+
+def test_rescaled_range_with_large_mean():
+    noise = np.random.default_rng(5).normal(size=2**18)
+    for offset in (1.0, 1e3, 1e6):
+        series = noise + offset
+        assert np.isclose(
+            RescaledRange(series, 4, 5000),
+            _reference_rescaled_range(series, 4, 5000),
+            rtol=1e-12,
+        )
+
+
+def test_rescaled_range_panel_matches_loop():
+    # series with and without a dominant mean are stacked together
+    offsets = np.array([0.0, 1e3, 0.0, 1e6, 0.1])
+    panel = np.random.default_rng(2).normal(size=(5, 3000)) + offsets[:, None]
+    expected = [RescaledRange(series, 10, 300) for series in panel]
+    assert np.allclose(RescaledRangePanel(panel, 10, 300, batchLen=6000), expected)
+
+
+def test_rolling_rescaled_range_matches_windows():
+    # windows aligned to every segment grid share segments with the series
+    # (segment sizes 16, 32 and 64; floor of logspace would turn 64 into 63)
+    series = np.random.default_rng(4).normal(size=4096)
+    rolling = RollingRescaledRange(series, 1024, 16, 64.5, step=64, points=3)
+    for idx, start in enumerate(range(0, len(series) - 1024 + 1, 64)):
+        expected = RescaledRange(
+            series[start : start + 1024], 16, 64.5, wrap=False, points=3
+        )
+        assert np.isclose(rolling[idx], expected, rtol=1e-10)
+
+
+def test_box_count_matches_reference():
+    cantor = _cantor(8)
+    occupancy = np.random.default_rng(3).random(10_000) < 0.05
+    for series in (cantor, occupancy.astype(int)):
+        for wrap in (True, False):
+            assert BoxCount1D(series, 2, 1000, wrap=wrap) == _reference_box_count(
+                series, 2, 1000, wrap=wrap
+            )
+
+
+def test_box_count_2d_of_cantor_dust():
+    cantor = _cantor(6)
+    dust = np.outer(cantor, cantor)
+    assert np.isclose(
+        BoxCount2D(dust, 3, 243, points=6), 2 * np.log10(2) / np.log10(3), atol=0.05
+    )
+
+
+def test_box_count_points_on_a_line():
+    # zero extent along one axis, the points form a one dimensional set
+    line = np.linspace(0, 1, 10_000)
+    for coords in (np.c_[line, np.ones_like(line)], np.c_[np.zeros_like(line), line]):
+        assert np.isclose(BoxCountPoints2D(coords, 2, 100), 1.0, atol=0.01)
+    assert BoxCountPoints2D(np.ones((10, 2)), 2, 100) == 0
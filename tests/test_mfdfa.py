@@ -0,0 +1,153 @@
+import numpy as np
+import pytest
+
+from .. import series_input
+from ..mfdfa import (
+    MakeFqs,
+    MakeMfDfa,
+    MakeMfDfaPanel,
+    MakeMfDfaSpectrum,
+    MakeSegMfDfa,
+    RollingMfDfa,
+)
+
+Q_SAMPLE = np.array([-3.0, -1.0, 0.0, 2.0, 4.0])
+SCALES = np.array([16, 32, 64, 128, 256])
+
+
+def _reference_mfdfa(series, q_sample, scale_sample):
+    # polyfit per segment and per q implementation of the baseline
+    profile = np.cumsum(series - np.mean(series))
+    hq = np.zeros(len(q_sample))
+    for q_idx, q in enumerate(q_sample):
+        fqs = np.zeros(len(scale_sample))
+        for s_idx, scale in enumerate(scale_sample):
+            segments = profile[: len(profile) // scale * scale].reshape(-1, scale)
+            x_vals = np.arange(scale)
+            variances = np.array(
+                [
+                    np.mean((seg - np.polyval(np.polyfit(x_vals, seg, 1), x_vals)) ** 2)
+                    for seg in segments
+                ]
+            )
+            if q != 0:
+                fqs[s_idx] = np.mean(variances ** (q / 2)) ** (1 / q)
+            else:
+                fqs[s_idx] = np.exp(0.5 * np.mean(np.log(variances)))
+        hq[q_idx] = np.polyfit(np.log10(scale_sample), np.log10(fqs), 1)[0]
+    return hq
+
+
+def _series(size, seed=1):
+    return np.random.default_rng(seed).standard_t(3, size=size)
+
+
+def test_mfdfa_matches_reference():
+    series = _series(2**13)
+    expected = _reference_mfdfa(series, Q_SAMPLE, SCALES)
+    assert np.allclose(MakeMfDfa(series, Q_SAMPLE, SCALES), expected, rtol=1e-10)
+    assert np.allclose(
+        MakeMfDfa(series, Q_SAMPLE, SCALES, batch=False), expected, rtol=1e-10
+    )
+
+
+def _binomial_cascade(p, levels):
+    # deterministic binomial multifractal, tau(q) = -log2(p**q + (1-p)**q)
+    cascade = np.ones(1)
+    for _ in range(levels):
+        cascade = np.kron(cascade, [p, 1 - p])
+    return cascade
+
+
+def test_spectrum_of_binomial_cascade():
+    p = 0.3
+    q_sample = np.linspace(-4, 4, 33)
+    scales = 2 ** np.arange(6, 13)
+    hq, tauq, alpha, falpha, fqs = MakeMfDfaSpectrum(
+        _binomial_cascade(p, 16), q_sample, scales
+    )
+    weights = np.vstack((p**q_sample, (1 - p) ** q_sample))
+    expected_tauq = -np.log2(np.sum(weights, axis=0))
+    expected_alpha = -np.log2([p, 1 - p]) @ weights / np.sum(weights, axis=0)
+    expected_falpha = q_sample * expected_alpha - expected_tauq
+    assert fqs.shape == (len(q_sample), len(scales))
+    assert np.allclose(
+        hq, np.polyfit(np.log10(scales), np.log10(fqs).T, 1)[0], rtol=1e-12
+    )
+    assert np.allclose(tauq, q_sample * hq - 1, rtol=1e-12)
+    # finite scales bias h(q) by a small constant
+    assert np.allclose(tauq, expected_tauq, atol=0.1)
+    assert np.allclose(alpha, expected_alpha, atol=0.03)
+    # one sided differences at the ends of the q grid are less accurate
+    assert np.allclose(falpha[1:-1], expected_falpha[1:-1], atol=0.005)
+
+
+def test_large_moments_do_not_overflow():
+    series = _series(2**13, seed=6)
+    q_sample = np.array([-20.0, 20.0])
+    expected = MakeMfDfa(series, q_sample, SCALES)
+    assert np.allclose(expected, _reference_mfdfa(series, q_sample, SCALES))
+    profile = np.cumsum(series - np.mean(series))
+    for factor, q in ((1e20, 20.0), (1e-20, -20.0)):
+        with np.errstate(all="ignore"):
+            naive = _reference_mfdfa(factor * series, [q], SCALES)
+        assert not np.all(np.isfinite(naive))
+        fqs = MakeFqs(factor * profile, q_sample, SCALES)
+        assert np.all(np.isfinite(fqs)) and np.all(fqs > 0)
+        assert np.allclose(fqs, factor * MakeFqs(profile, q_sample, SCALES))
+        assert np.allclose(MakeMfDfa(factor * series, q_sample, SCALES), expected)
+
+
+def test_seg_mfdfa_workers_match_serial():
+    series = _series(2**14, seed=2)
+    serial = MakeSegMfDfa(series, Q_SAMPLE, SCALES, segmentSize=2**12)
+    parallel = MakeSegMfDfa(series, Q_SAMPLE, SCALES, segmentSize=2**12, workers=2)
+    assert np.array_equal(parallel, serial)
+
+
+def test_seg_mfdfa_workers_map_files(tmp_path, monkeypatch):
+    # file-backed series (and their views) are mapped by the workers
+    # instead of being copied into shared memory
+    series = _series(2**14, seed=2)
+    path = str(tmp_path / "series.npy")
+    np.save(path, series)
+
+    def _no_shared_memory(*args, **kwargs):
+        pytest.fail("file-backed series copied into shared memory")
+
+    monkeypatch.setattr(series_input.shared_memory, "SharedMemory", _no_shared_memory)
+    for source, data in (
+        (path, series),
+        (np.load(path, mmap_mode="r")[1000:], series[1000:]),
+    ):
+        serial = MakeSegMfDfa(data, Q_SAMPLE, SCALES, segmentSize=2**12)
+        parallel = MakeSegMfDfa(source, Q_SAMPLE, SCALES, segmentSize=2**12, workers=2)
+        assert np.array_equal(parallel, serial)
+
+
+def test_mfdfa_of_file_and_chunks(tmp_path):
+    series = _series(2**14, seed=3)
+    path = str(tmp_path / "series.npy")
+    np.save(path, series)
+    expected = MakeMfDfa(series, Q_SAMPLE, SCALES)
+    assert np.allclose(MakeMfDfa(path, Q_SAMPLE, SCALES), expected, rtol=1e-10)
+    chunks = iter(np.array_split(series, 11))
+    assert np.allclose(MakeMfDfa(chunks, Q_SAMPLE, SCALES), expected, rtol=1e-10)
+
+
+def test_mfdfa_panel_matches_loop():
+    panel = _series(6 * 2048, seed=4).reshape(6, 2048)
+    expected = np.array([MakeMfDfa(series, Q_SAMPLE, SCALES) for series in panel])
+    assert np.allclose(
+        MakeMfDfaPanel(panel, Q_SAMPLE, SCALES, batchLen=2 * 2048), expected
+    )
+
+
+def test_rolling_mfdfa_matches_windows():
+    # windows aligned to every segment grid share segments with the series
+    series = _series(2**13, seed=5)
+    window, step = 2048, 256
+    rolling = RollingMfDfa(series, Q_SAMPLE, SCALES, window, step=step)
+    for idx, start in enumerate(range(0, len(series) - window + 1, step)):
+        expected = MakeMfDfa(series[start : start + window], Q_SAMPLE, SCALES)
+        assert np.allclose(rolling[idx], expected, rtol=1e-10)
@@ -0,0 +1,73 @@
+import json
+import tracemalloc
+
+import numpy as np
+
+from ..hurst import RescaledRange
+from ..mfdfa import MakeMfDfa
+from ..profiling import add_callback, is_enabled, profile, remove_callback, stage
+from ..psd import make_seg_log_psd
+
+
+def _series():
+    return np.random.default_rng(1).normal(size=2**14)
+
+
+def test_stages_are_recorded():
+    series = _series()
+    with profile() as profiler:
+        make_seg_log_psd(series, segment_len=2**12)
+        MakeMfDfa(series, np.array([2.0]), np.array([16, 32, 64]))
+    stages = profiler.as_dict()
+    for name in ("psd.fft", "psd.log_bin", "mfdfa.detrend", "mfdfa.fit"):
+        assert stages[name]["calls"] > 0 and stages[name]["time"] >= 0
+    assert "peak" not in stages["psd.fft"]
+    assert json.loads(profiler.to_json()) == stages
+    assert not is_enabled()
+
+
+def test_disabled_stage_is_shared_null_context():
+    assert stage("a") is stage("b")
+
+
+def test_callbacks_receive_stages():
+    events = []
+    callback = lambda *event: events.append(event)  # noqa: E731
+    add_callback(callback)
+    try:
+        with stage("outer"):
+            with stage("inner"):
+                pass
+    finally:
+        remove_callback(callback)
+    assert [event[0] for event in events] == ["inner", "outer"]
+    assert events[1][1] >= events[0][1]
+    assert events[0][2:] == (None, None)
+
+
+def test_memory_profile():
+    with profile(memory=True) as profiler:
+        with stage("outer"):
+            with stage("inner"):
+                block = np.ones(2**20)
+                del block
+            kept = np.ones(2**18)
+    stages = profiler.as_dict()
+    assert stages["inner"]["peak"] >= 2**23
+    assert stages["outer"]["peak"] >= stages["inner"]["peak"]
+    assert stages["outer"]["allocated"] >= kept.nbytes
+    assert not tracemalloc.is_tracing()
+
+
+def test_peak_of_external_tracing_is_kept():
+    tracemalloc.start()
+    try:
+        block = np.ones(10**7)
+        del block
+        for memory in (False, True):
+            with profile(memory=memory):
+                RescaledRange(_series(), 10, 1000)
+            assert tracemalloc.get_traced_memory()[1] >= 8 * 10**7
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
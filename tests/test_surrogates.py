@@ -0,0 +1,92 @@
+from functools import partial
+
+import numpy as np
+import pytest
+
+from ..mfdfa import MakeMfDfa, MakeMfDfaPanel
+from ..surrogates import (
+    SURROGATES,
+    block_bootstrap,
+    bootstrap_exponent_interval,
+    surrogate_exponent_band,
+)
+
+Q_SAMPLE = np.array([2.0])
+SCALES = np.array([16, 32, 64, 128])
+
+
+def _series():
+    return np.random.default_rng(1).normal(size=2048)
+
+
+def test_surrogates_preserve_properties():
+    series = _series()
+    shuffled = SURROGATES["shuffle"](series, 3, seed=2)
+    assert np.array_equal(np.sort(shuffled, axis=1), np.tile(np.sort(series), (3, 1)))
+    phase = SURROGATES["phase"](series, 3, seed=3)
+    assert np.allclose(
+        np.abs(np.fft.rfft(phase, axis=1)), np.abs(np.fft.rfft(series)), rtol=1e-8
+    )
+    iaaft = SURROGATES["iaaft"](series, 3, seed=4)
+    assert np.array_equal(np.sort(iaaft, axis=1), np.tile(np.sort(series), (3, 1)))
+
+
+def test_band_does_not_depend_on_workers_or_batching():
+    series = _series()
+    estimator = partial(MakeMfDfa, qSample=Q_SAMPLE, scaleSample=SCALES)
+    panel_estimator = partial(MakeMfDfaPanel, qSample=Q_SAMPLE, scaleSample=SCALES)
+    kwargs = dict(n_surrogates=20, batch_size=6, seed=5)
+    value, samples, low, high = surrogate_exponent_band(series, estimator, **kwargs)
+    assert samples.shape == (20, 1)
+    assert np.all(low <= high)
+    parallel = surrogate_exponent_band(series, estimator, workers=2, **kwargs)
+    batched = surrogate_exponent_band(
+        series, panel_estimator, batched=True, workers=2, **kwargs
+    )
+    for result in (parallel, batched):
+        assert np.allclose(result[0], value)
+        assert np.allclose(result[1], samples)
+
+
+def test_block_bootstrap_consists_of_blocks():
+    series = np.arange(100.0)
+    resamples = block_bootstrap(series, 4, seed=6, block_size=8)
+    assert resamples.shape == (4, 100)
+    # consecutive values within blocks, blocks wrap around the end
+    steps = np.diff(resamples, axis=1)[:, np.arange(99) % 8 != 7]
+    assert np.all((steps == 1) | (steps == -99))
+
+
+def test_bootstrap_interval_does_not_depend_on_workers_or_batching():
+    series = _series()
+    estimator = partial(MakeMfDfa, qSample=Q_SAMPLE, scaleSample=SCALES)
+    panel_estimator = partial(MakeMfDfaPanel, qSample=Q_SAMPLE, scaleSample=SCALES)
+    kwargs = dict(n_samples=20, block_size=256, batch_size=6, seed=7)
+    value, samples, low, high = bootstrap_exponent_interval(series, estimator, **kwargs)
+    assert samples.shape == (20, 1)
+    # white noise, h(2) = 0.5 and the estimate are within the interval
+    assert np.all(low <= value) and np.all(value <= high)
+    assert np.all(low <= 0.5) and np.all(0.5 <= high)
+    parallel = bootstrap_exponent_interval(series, estimator, workers=2, **kwargs)
+    batched = bootstrap_exponent_interval(
+        series, panel_estimator, batched=True, workers=2, **kwargs
+    )
+    for result in (parallel, batched):
+        assert np.allclose(result[0], value)
+        assert np.allclose(result[1], samples)
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        surrogate_exponent_band(_series(), np.mean, method="unknown")
+
+
+def test_band_of_file_matches_in_memory(tmp_path):
+    series = _series()
+    path = str(tmp_path / "series.npy")
+    np.save(path, series)
+    estimator = partial(MakeMfDfa, qSample=Q_SAMPLE, scaleSample=SCALES)
+    kwargs = dict(n_surrogates=8, batch_size=4, seed=8)
+    expected = surrogate_exponent_band(series, estimator, **kwargs)
+    result = surrogate_exponent_band(path, estimator, workers=2, **kwargs)
+    assert np.array_equal(result[1], expected[1])